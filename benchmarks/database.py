@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+'''Benchmark operacji com.bps.news.database.Database na syntetycznej bazie.
+
+Generuje bazę (kanały, foldery, newsy z treścią HTML, słownik z wagami), mierzy czasy wybranych
+operacji i zapisuje wyniki w JSON, który można porównać z wynikami poprzedniego uruchomienia.
+
+    python3 benchmarks/database.py --news 100000 --output before.json
+    python3 benchmarks/database.py --news 100000 --output after.json --compare before.json
+    python3 benchmarks/database.py --database /tmp/news-1m.sqlite3 --news 1000000 --reuse
+'''
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import tempfile
+import argparse
+import platform
+import statistics
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import com.bps.news.scoring
+from com.bps.news.database import Database
+from synthetic import make_vocabulary, TextGenerator
+
+
+def generate(filename, channels, news, words, folders, read_ratio, seed):
+    '''Tworzy syntetyczną bazę, zwraca czasy etapów w sekundach.'''
+    times = {}
+    vocabulary = make_vocabulary(words, seed)
+    text = TextGenerator(vocabulary, seed)
+
+    start = time.perf_counter()
+    Database.create_new(filename)
+    db = Database(filename)
+    for i in range(folders):
+        db.add_folder(f'Folder {i:03d}')
+    for i in range(channels):
+        db.add_channel(f'Channel {i:05d}', f'https://feeds{i % 50}.example.com/{i}.xml', 0)
+        if folders and i % 3:
+            db.move_channel(f'Channel {i:05d}', f'Folder {i % folders:03d}')
+    times['channels'] = time.perf_counter() - start
+
+    # newsy dodawane porcjami przez add_news, razem z indeksem słów i FTS
+    start = time.perf_counter()
+    news_id = 0
+    per_batch = 500
+    while news_id < news:
+        channel = f'Channel {text.randint(0, channels - 1):05d}'
+        count = min(per_batch, news - news_id)
+        items = []
+        for i in range(count):
+            items.append({
+                'title': text.title(),
+                'link': f'https://example.com/news/{news_id + i}',
+                'summary': text.summary()
+            })
+        db.add_news(channel, items)
+        db.commit()
+        news_id += count
+    times['news'] = time.perf_counter() - start
+
+    # wagi słów jak po kilkuset kliknięciach "like"
+    start = time.perf_counter()
+    db.recommend_update_words([(word, random.Random(seed + i).randint(-5, 10)) for i, word in enumerate(vocabulary[:2000])])
+    db.commit()
+    db.close()
+
+    # większość newsów w prawdziwej bazie jest przeczytana
+    connection = sqlite3.connect(filename)
+    connection.execute('update news set is_read = 1 where abs(random() % 100) < ?', (int(read_ratio * 100),))
+    connection.commit()
+    connection.execute('analyze')
+    connection.close()
+    times['read'] = time.perf_counter() - start
+
+    return times
+
+
+def measure(fn, repeat, warmup=1):
+    for i in range(warmup):
+        fn()
+
+    timings = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    timings.sort()
+    return {
+        'repeat': repeat,
+        'min_ms': timings[0],
+        'median_ms': statistics.median(timings),
+        'mean_ms': statistics.mean(timings),
+        'p90_ms': timings[min(len(timings) - 1, int(len(timings) * 0.9))],
+        'max_ms': timings[-1]
+    }
+
+
+def run_benchmarks(filename, repeat, words, seed):
+    rnd = random.Random(seed)
+    vocabulary = make_vocabulary(words, seed)
+    text = TextGenerator(vocabulary, seed + 1)
+
+    db = Database(filename)
+    channel_titles = [row['title'] for row in db.get_channels()]
+    added = [0]
+
+    def add_news():
+        # typowa aktualizacja kanału - kilkanaście nowych wpisów
+        items = []
+        for i in range(20):
+            items.append({
+                'title': text.title(),
+                'link': f'https://example.com/bench/{seed}/{time.time_ns()}/{added[0]}',
+                'summary': text.summary()
+            })
+            added[0] += 1
+        db.add_news(rnd.choice(channel_titles), items)
+        db.commit()
+
+    operations = [
+        ('add_news', add_news),
+        ('get_channels', lambda: db.get_channels()),
+        ('get_news', lambda: db.get_news(rnd.choice(channel_titles))),
+        ('get_news_next', lambda: db.get_news_next()),
+        ('get_news_count', lambda: db.get_news_count()),
+        ('recommend_update_quality_all', lambda: db.recommend_update_quality_all()),
+        ('recommend_update_quality', lambda: db.recommend_update_quality(rnd.choice(vocabulary[:2000])))
+    ]
+
+    results = {}
+    try:
+        for name, fn in operations:
+            results[name] = measure(fn, repeat)
+            print(f'{name:>30}: median {results[name]["median_ms"]:9.2f} ms, min {results[name]["min_ms"]:9.2f} ms, max {results[name]["max_ms"]:9.2f} ms')
+    finally:
+        db.close()
+
+    return results
+
+
+def dataset_info(filename):
+    connection = sqlite3.connect(f'file:{filename}?mode=ro', uri=True)
+    try:
+        return {
+            'channels': connection.execute('select count(*) from channel').fetchone()[0],
+            'news': connection.execute('select count(*) from news').fetchone()[0],
+            'unread_news': connection.execute('select count(*) from news where is_read = 0').fetchone()[0],
+            'words': connection.execute('select count(*) from words').fetchone()[0],
+            'file_size': os.path.getsize(filename)
+        }
+    finally:
+        connection.close()
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, previous_file):
+    with open(previous_file) as f:
+        previous = json.load(f)['results']
+
+    print(f'\ncompared with {previous_file} (median):')
+    for name, result in results.items():
+        if name in previous:
+            before = previous[name]['median_ms']
+            after = result['median_ms']
+            print(f'{name:>30}: {before:9.2f} ms -> {after:9.2f} ms ({after / before if before else float("inf"):5.2f}x)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Database benchmark')
+    parser.add_argument('--database', help='plik bazy, domyślnie plik tymczasowy usuwany po pomiarach')
+    parser.add_argument('--reuse', action='store_true', help='użyj istniejącego pliku --database zamiast generować nowy')
+    parser.add_argument('--channels', type=int, default=1000)
+    parser.add_argument('--news', type=int, default=100000)
+    parser.add_argument('--words', type=int, default=50000, help='wielkość słownika')
+    parser.add_argument('--folders', type=int, default=20)
+    parser.add_argument('--read-ratio', type=float, default=0.8, help='część newsów oznaczona jako przeczytane')
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default='database-benchmark.json', help='plik JSON z wynikami')
+    parser.add_argument('--compare', help='plik JSON z poprzedniego uruchomienia')
+    args = parser.parse_args()
+
+    temp_dir = None
+    filename = args.database
+    if filename is None:
+        temp_dir = tempfile.TemporaryDirectory(prefix='news-benchmark-')
+        filename = os.path.join(temp_dir.name, 'news.sqlite3')
+
+    try:
+        generate_times = None
+        if not (args.reuse and os.path.isfile(filename)):
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(filename + suffix):
+                    os.remove(filename + suffix)
+
+            print(f'generating {args.channels} channels, {args.news} news, {args.words} words...')
+            generate_times = generate(filename, args.channels, args.news, args.words, args.folders, args.read_ratio, args.seed)
+            print('generated in ' + ', '.join(f'{name} {seconds:.1f} s' for name, seconds in generate_times.items()))
+
+        dataset = dataset_info(filename)
+        print(f'dataset: {dataset}')
+
+        results = run_benchmarks(filename, args.repeat, args.words, args.seed)
+
+        report = {
+            'meta': {
+                'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'revision': git_revision(),
+                'python': platform.python_version(),
+                'sqlite': sqlite3.sqlite_version,
+                'numpy': com.bps.news.scoring.is_available(),
+                'args': vars(args)
+            },
+            'dataset': dataset,
+            'generate_s': generate_times,
+            'results': results
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'results saved to {args.output}')
+
+        if args.compare:
+            compare(results, args.compare)
+    finally:
+        if temp_dir is not None:
+            temp_dir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
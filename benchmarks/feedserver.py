@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+'''Lokalny serwer HTTP z generowanymi kanałami RSS, Atom i YouTube, zamiast prawdziwych serwisów.
+
+Kanał numer n jest dostępny pod /rss/n.xml, /atom/n.xml i /youtube/n.xml. Treść zależy tylko od
+numeru kanału, ziarna i wersji kanału, więc kolejne uruchomienia dostają te same dane. Kanał
+zmienia wersję (nowe wpisy na początku) z prawdopodobieństwem --change-rate przy każdym
+kolejnym pobraniu; niezmieniony kanał odpowiada 304 na If-None-Match / If-Modified-Since.
+
+Przy --hosts N serwer nasłuchuje na 127.0.0.1 ... 127.0.0.N (ten sam port), aby limit połączeń
+na host w Updater działał jak przy wielu serwisach. Pierwsza linia wyjścia to adres serwera.
+
+    python3 benchmarks/feedserver.py --port 8080 --latency 0.2 --error-rate 0.02
+'''
+import os
+import sys
+import gzip
+import time
+import random
+import argparse
+import threading
+import email.utils
+import http.server
+import xml.sax.saxutils
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import make_vocabulary, TextGenerator
+
+
+FORMATS = ('rss', 'atom', 'youtube')
+
+# wszystkie kanały udają że powstały w tym samym momencie, wersja przesuwa datę o godzinę
+EPOCH = 1700000000
+
+
+def escape(text):
+    return xml.sax.saxutils.escape(text, {'"': '&quot;'})
+
+
+class FeedGenerator:
+    '''Treść kanałów w kolejnych wersjach, nowa wersja dodaje new_items wpisów na początku.'''
+
+    def __init__(self, vocabulary, items=20, new_items=3, min_words=30, max_words=120, seed=1):
+        self._text = TextGenerator(vocabulary)
+        self._text_lock = threading.Lock()
+        self._items = items
+        self._new_items = new_items
+        self._min_words = min_words
+        self._max_words = max_words
+        self._seed = seed
+
+    def _entry(self, channel, number):
+        # wpis generowany z własnego ziarna, więc jest taki sam w każdej wersji kanału
+        with self._text_lock:
+            self._text.seed(f'{self._seed}-{channel}-{number}')
+            title = self._text.title()
+            summary = self._text.summary(self._min_words, self._max_words)
+        return {
+            'id': f'{channel}-{number}',
+            'title': title,
+            'summary': summary,
+            'published': EPOCH + number * 600
+        }
+
+    def entries(self, channel, version):
+        last = self._items + version * self._new_items
+        return [self._entry(channel, number) for number in range(last - 1, max(-1, last - self._items - 1), -1)]
+
+    def render(self, feed_format, base_url, channel, version):
+        entries = self.entries(channel, version)
+        updated = EPOCH + version * 3600
+        return getattr(self, f'_render_{feed_format}')(base_url, channel, entries, updated).encode('utf-8')
+
+    def _render_rss(self, base_url, channel, entries, updated):
+        items = ''.join(f'''
+    <item>
+      <title>{escape(entry['title'])}</title>
+      <link>{base_url}/news/{entry['id']}</link>
+      <guid>{base_url}/news/{entry['id']}</guid>
+      <pubDate>{email.utils.formatdate(entry['published'], usegmt=True)}</pubDate>
+      <description>{escape(entry['summary'])}</description>
+    </item>''' for entry in entries)
+        return f'''<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0">
+  <channel>
+    <title>Channel {channel}</title>
+    <link>{base_url}/</link>
+    <description>Synthetic RSS channel {channel}</description>
+    <lastBuildDate>{email.utils.formatdate(updated, usegmt=True)}</lastBuildDate>{items}
+  </channel>
+</rss>
+'''
+
+    def _render_atom(self, base_url, channel, entries, updated):
+        items = ''.join(f'''
+  <entry>
+    <id>{base_url}/news/{entry['id']}</id>
+    <title>{escape(entry['title'])}</title>
+    <link rel="alternate" href="{base_url}/news/{entry['id']}"/>
+    <updated>{time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(entry['published']))}</updated>
+    <content type="html">{escape(entry['summary'])}</content>
+  </entry>''' for entry in entries)
+        return f'''<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom">
+  <id>{base_url}/atom/{channel}</id>
+  <title>Channel {channel}</title>
+  <updated>{time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(updated))}</updated>{items}
+</feed>
+'''
+
+    def _render_youtube(self, base_url, channel, entries, updated):
+        # jak https://www.youtube.com/feeds/videos.xml - opis filmu jako zwykły tekst w media:group
+        items = ''.join(f'''
+  <entry>
+    <id>yt:video:{entry['id']}</id>
+    <yt:videoId>{entry['id']}</yt:videoId>
+    <yt:channelId>UC{channel:022d}</yt:channelId>
+    <title>{escape(entry['title'])}</title>
+    <link rel="alternate" href="{base_url}/watch?v={entry['id']}"/>
+    <author><name>Channel {channel}</name></author>
+    <published>{time.strftime('%Y-%m-%dT%H:%M:%S+00:00', time.gmtime(entry['published']))}</published>
+    <media:group>
+      <media:title>{escape(entry['title'])}</media:title>
+      <media:thumbnail url="{base_url}/vi/{entry['id']}/hqdefault.jpg" width="480" height="360"/>
+      <media:description>{escape(entry['summary'])}</media:description>
+    </media:group>
+  </entry>''' for entry in entries)
+        return f'''<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns:yt="http://www.youtube.com/xml/schemas/2015" xmlns:media="http://search.yahoo.com/mrss/" xmlns="http://www.w3.org/2005/Atom">
+  <id>yt:channel:UC{channel:022d}</id>
+  <title>Channel {channel}</title>
+  <published>{time.strftime('%Y-%m-%dT%H:%M:%S+00:00', time.gmtime(updated))}</published>{items}
+</feed>
+'''
+
+
+class FeedState:
+    '''Wersje kanałów i gotowe odpowiedzi, wspólne dla wszystkich wątków serwera.'''
+
+    def __init__(self, generator, change_rate=0.1, error_rate=0.0, latency=0.0, jitter=0.0, validators=True, seed=1):
+        self.generator = generator
+        self.change_rate = change_rate
+        self.error_rate = error_rate
+        self.latency = latency
+        self.jitter = jitter
+        self.validators = validators
+        self.requests = 0
+        self.not_modified = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._versions = {}
+        self._bodies = {}
+        self._lock = threading.Lock()
+
+    def count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def next_version(self, key):
+        '''Wersja kanału dla bieżącego pobrania, pierwsze pobranie dostaje wersję 0.'''
+        with self._lock:
+            if key not in self._versions:
+                self._versions[key] = 0
+            elif self._random.random() < self.change_rate:
+                self._versions[key] += 1
+            return self._versions[key]
+
+    def draw_error(self):
+        with self._lock:
+            if self._random.random() >= self.error_rate:
+                return None
+            self.errors += 1
+            return self._random.choice(('500', '404', 'malformed', 'reset'))
+
+    def delay(self):
+        with self._lock:
+            return max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+
+    def get_body(self, key, version, base_url, compressed):
+        '''Treść kanału (opcjonalnie gzip), generowana raz dla każdej wersji.'''
+        cache_key = (key, version, compressed)
+        body = self._bodies.get(cache_key)
+        if body is None:
+            feed_format, channel = key
+            body = self.generator.render(feed_format, base_url, channel, version)
+            if compressed:
+                body = gzip.compress(body, 6)
+            with self._lock:
+                # poprzednie wersje nie będą już potrzebne
+                self._bodies.pop((key, version - 1, compressed), None)
+                self._bodies[cache_key] = body
+        return body
+
+
+class FeedRequestHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        state = self.server.state
+        state.count('requests')
+        time.sleep(state.delay())
+
+        key = self._parse_path()
+        if key is None:
+            self._send_status(404)
+            return
+
+        error = state.draw_error()
+        if error in ('500', '404'):
+            self._send_status(int(error))
+            return
+        if error == 'reset':
+            # zerwane połączenie bez odpowiedzi
+            self.close_connection = True
+            return
+
+        version = state.next_version(key)
+        etag = f'"{key[0]}-{key[1]}-{version}"'
+        last_modified = email.utils.formatdate(EPOCH + version * 3600, usegmt=True)
+
+        if state.validators and (
+            self.headers.get('If-None-Match') == etag
+            or (self.headers.get('If-None-Match') is None and self.headers.get('If-Modified-Since') == last_modified)
+        ):
+            state.count('not_modified')
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            self.close_connection = True
+            return
+
+        compressed = 'gzip' in self.headers.get('Accept-Encoding', '')
+        base_url = f'http://{self.headers.get("Host", "localhost")}'
+        body = state.get_body(key, version, base_url, compressed)
+        if error == 'malformed':
+            # ucięty XML, jak przy przerwanym generowaniu kanału po stronie serwisu
+            body = state.generator.render(key[0], base_url, key[1], version)[:200]
+            compressed = False
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/atom+xml' if key[0] != 'rss' else 'application/rss+xml')
+        self.send_header('Content-Length', str(len(body)))
+        if compressed:
+            self.send_header('Content-Encoding', 'gzip')
+        if state.validators:
+            self.send_header('ETag', etag)
+            self.send_header('Last-Modified', last_modified)
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(body)
+        self.close_connection = True
+
+    def _parse_path(self):
+        parts = self.path.split('?', 1)[0].strip('/').split('/')
+        if len(parts) != 2 or parts[0] not in FORMATS or not parts[1].endswith('.xml'):
+            return None
+        try:
+            return parts[0], int(parts[1][:-4])
+        except ValueError:
+            return None
+
+    def _send_status(self, status):
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+
+class FeedServer:
+    '''Serwery HTTP na adresach 127.0.0.1 ... 127.0.0.hosts, każdy w osobnym wątku.'''
+
+    def __init__(self, state, port=0, hosts=1):
+        self._servers = []
+        for i in range(max(1, hosts)):
+            server = http.server.ThreadingHTTPServer((f'127.0.0.{i + 1}', port), FeedRequestHandler)
+            server.daemon_threads = True
+            server.state = state
+            # kolejne adresy na tym samym porcie co pierwszy
+            port = server.server_address[1]
+            self._servers.append(server)
+        self.port = port
+        self.state = state
+        self._threads = []
+
+    def url(self, channel, feed_format='rss'):
+        return feed_url(self.port, len(self._servers), channel, feed_format)
+
+    def start(self):
+        for server in self._servers:
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+
+
+def feed_url(port, hosts, channel, feed_format='rss'):
+    return f'http://127.0.0.{channel % max(1, hosts) + 1}:{port}/{feed_format}/{channel}.xml'
+
+
+def add_arguments(parser):
+    '''Opcje serwera wspólne z benchmarks/update.py.'''
+    parser.add_argument('--hosts', type=int, default=20, help='ilość adresów 127.0.0.x (na macOS działa tylko 1)')
+    parser.add_argument('--latency', type=float, default=0.1, help='opóźnienie odpowiedzi w sekundach')
+    parser.add_argument('--jitter', type=float, default=0.05, help='losowe odchylenie opóźnienia w sekundach')
+    parser.add_argument('--items', type=int, default=20, help='ilość wpisów w kanale')
+    parser.add_argument('--min-words', type=int, default=30, help='minimalna długość treści wpisu')
+    parser.add_argument('--max-words', type=int, default=120, help='maksymalna długość treści wpisu')
+    parser.add_argument('--words', type=int, default=20000, help='wielkość słownika')
+    parser.add_argument('--change-rate', type=float, default=0.2, help='prawdopodobieństwo zmiany kanału przy kolejnym pobraniu')
+    parser.add_argument('--error-rate', type=float, default=0.02, help='część odpowiedzi z błędem (500, 404, ucięty XML, zerwane połączenie)')
+    parser.add_argument('--no-validators', action='store_true', help='bez ETag i Last-Modified, zawsze pełna odpowiedź')
+    parser.add_argument('--seed', type=int, default=1)
+
+
+def create_server(args, port=0):
+    generator = FeedGenerator(make_vocabulary(args.words, args.seed), args.items, min_words=args.min_words, max_words=args.max_words, seed=args.seed)
+    state = FeedState(
+        generator, change_rate=args.change_rate, error_rate=args.error_rate,
+        latency=args.latency, jitter=args.jitter, validators=not args.no_validators, seed=args.seed
+    )
+    return FeedServer(state, port, args.hosts)
+
+
+def serve(args, connection):
+    '''Uruchamia serwer w procesie potomnym: wysyła port, czeka na polecenie końca i odsyła statystyki.'''
+    server = create_server(args)
+    server.start()
+    connection.send(server.port)
+    try:
+        connection.recv()
+    finally:
+        server.stop()
+        state = server.state
+        connection.send({'requests': state.requests, 'not_modified': state.not_modified, 'errors': state.errors})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Synthetic feed server')
+    parser.add_argument('--port', type=int, default=8080)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = create_server(args, args.port)
+    server.start()
+    print(f'http://127.0.0.1:{server.port}/rss/0.xml', flush=True)
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        state = server.state
+        print(f'requests: {state.requests}, not modified: {state.not_modified}, errors: {state.errors}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+'''Mikro-benchmark wyciągania tekstu z HTML treści newsów (com.bps.news.text.NewsParser).
+
+Porównuje obecny parser z poprzednią wersją (sklejanie tekstu przez +=, print dla każdego
+nieobsłużonego znacznika zamykającego). Dane to syntetyczne opisy w stylu YouTube i Wykop
+lub największe treści z istniejącej bazy (--database). Przed pomiarem sprawdzane są niezamknięte
+znaczniki przed długim tekstem; jeśli któryś przypadek trwa dłużej niż sekundę, kod wyjścia to 1.
+
+    python3 benchmarks/parser.py
+    python3 benchmarks/parser.py --database ~/.config/news/news.sqlite3 --limit 200
+'''
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+import contextlib
+import html.parser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import com.bps.news.text
+
+
+class LegacyNewsParser(html.parser.HTMLParser):
+    '''Parser sprzed zmian, do porównania.'''
+
+    def __init__(self):
+        super().__init__()
+        self._text = ''
+        self._processed_tags = []
+
+    def handle_endtag(self, tag):
+        if tag not in self._processed_tags:
+            print(f'Unprocessed tag: {tag}')
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'br':
+            self._text += '\n'
+        self._processed_tags = ['br']
+
+    def handle_data(self, data):
+        self._text += data
+
+    def get_text(self):
+        return self._text.strip()
+
+
+WORDS = 'news kanał film nowy odcinek subskrybuj link opis wideo programista python linux rust update release wykop'.split()
+
+
+def youtube_summary(rnd, lines):
+    # długie opisy z linkami i <br> w każdej linii
+    parts = []
+    for i in range(lines):
+        words = ' '.join(rnd.choices(WORDS, k=rnd.randint(3, 12)))
+        if i % 3 == 0:
+            parts.append(f'{words} <a href="https://www.youtube.com/redirect?q=https%3A%2F%2Fexample.com%2F{i}">https://example.com/{i}</a><br>')
+        else:
+            parts.append(f'{words}<br />')
+    return ''.join(parts)
+
+
+def wykop_summary(rnd, paragraphs):
+    # dużo znaczników, mało tekstu
+    parts = []
+    for i in range(paragraphs):
+        words = ' '.join(rnd.choices(WORDS, k=rnd.randint(5, 20)))
+        parts.append(
+            f'<p><img src="https://www.wykop.pl/cdn/{i}.jpg" /><span class="tag">#{rnd.choice(WORDS)}</span> '
+            f'<strong>{words}</strong> <em>{rnd.choice(WORDS)}</em></p>'
+            f'<ul><li><a href="https://www.wykop.pl/link/{i}/">{words}</a></li></ul>'
+        )
+    return '<div>' + ''.join(parts) + '</div>'
+
+
+def synthetic_summaries(count, seed):
+    rnd = random.Random(seed)
+    summaries = []
+    for i in range(count):
+        if i % 2:
+            summaries.append(youtube_summary(rnd, rnd.randint(50, 400)))
+        else:
+            summaries.append(wykop_summary(rnd, rnd.randint(20, 200)))
+    return summaries
+
+
+def pathological_summaries(size=100000):
+    '''Niezamknięte znaczniki i cudzysłowy przed długim tekstem: "a<b" w zwykłym tekście, ucięty HTML.'''
+    text = 'x' * size
+    return [
+        'if a<b then ' + text,
+        '<a href="' + text,
+        'a<b c=' + 'y z ' * (size // 4),
+        'x<y' * (size // 3),
+        'x<y "' * (size // 5),
+        '<a b="' + '<c ' * (size // 3),
+        '<!-- ' + text,
+        '<script>' + text
+    ]
+
+
+def check_pathological(limit=1.0):
+    '''Sprawdza czy parser ma czas liniowy dla niezamkniętych znaczników, zwraca listę zbyt wolnych przypadków.'''
+    slow = []
+    for summary in pathological_summaries():
+        start = time.perf_counter()
+        com.bps.news.text.html_to_text(summary)
+        elapsed = time.perf_counter() - start
+        if elapsed > limit:
+            slow.append((summary[:20], elapsed))
+    return slow
+
+
+def database_summaries(filename, limit):
+    '''Największe treści z pliku bazy (spakowane lub nie).'''
+    connection = sqlite3.connect(f'file:{filename}?mode=ro', uri=True)
+    try:
+        rows = connection.execute('select summary from news order by length(summary) desc limit ?', (limit,)).fetchall()
+    finally:
+        connection.close()
+    return [com.bps.news.text.decompress(row[0]) for row in rows]
+
+
+def run(parser_class, summaries, repeat):
+    best = None
+    # wypisywanie znaczników jest częścią kosztu, ale nie zaśmieca wyniku
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for i in range(repeat):
+            start = time.perf_counter()
+            for summary in summaries:
+                parser = parser_class()
+                parser.feed(summary)
+                parser.close()
+                parser.get_text()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='NewsParser micro-benchmark')
+    parser.add_argument('--database', help='plik bazy news.sqlite3 z prawdziwymi treściami')
+    parser.add_argument('--limit', type=int, default=200, help='ilość treści')
+    parser.add_argument('--repeat', type=int, default=3, help='ilość powtórzeń, liczy się najlepszy czas')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--no-legacy', action='store_true', help='pomiń poprzednią wersję parsera')
+    args = parser.parse_args()
+
+    if args.database:
+        summaries = database_summaries(args.database, args.limit)
+    else:
+        summaries = synthetic_summaries(args.limit, args.seed)
+
+    # regresja: wyrażenie regularne z zagnieżdżonym powtórzeniem zawieszało wątek zapisu bazy
+    slow = check_pathological()
+    for start, elapsed in slow:
+        print(f'slow unclosed tag case {start!r}...: {elapsed:.1f} s')
+    if slow:
+        return 1
+
+    total = sum(len(summary) for summary in summaries)
+    print(f'summaries: {len(summaries)}, total size: {total / 1024 / 1024:.1f} MiB, largest: {max(map(len, summaries), default=0) / 1024:.0f} KiB')
+
+    parsers = [('NewsParser', com.bps.news.text.NewsParser)]
+    if not args.no_legacy:
+        parsers.append(('LegacyNewsParser', LegacyNewsParser))
+
+    for name, parser_class in parsers:
+        elapsed = run(parser_class, summaries, args.repeat)
+        print(f'{name:>18}: {elapsed * 1000:8.1f} ms, {total / 1024 / 1024 / elapsed:6.1f} MiB/s')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
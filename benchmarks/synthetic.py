@@ -0,0 +1,60 @@
+'''Generator syntetycznych danych dla benchmarków: słownik, tytuły i treści newsów.'''
+import random
+import itertools
+
+
+SYLLABLES = (
+    'ka', 'no', 'wi', 'ra', 'te', 'ło', 'mi', 'pro', 'gra', 'sto', 'dy', 'ze', 'lin', 'ux', 'py',
+    'da', 'ta', 'ko', 'rze', 'cz', 'po', 'wy', 'na', 'ja', 'ro', 'be', 'tu', 'si', 'la', 'me'
+)
+
+
+def make_vocabulary(size, seed=1):
+    '''Zwraca size różnych słów dłuższych niż 3 znaki (krótsze są pomijane przy ocenie newsów).'''
+    rnd = random.Random(seed)
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rnd.choices(SYLLABLES, k=rnd.randint(2, 5))))
+    words = [word for word in words if len(word) > 3]
+    while len(words) < size:
+        words.append(f'slowo{len(words)}')
+    return sorted(words)[:size]
+
+
+class TextGenerator:
+    '''Losuje słowa z rozkładem Zipfa, tak jak w prawdziwych tekstach.'''
+
+    def __init__(self, vocabulary, seed=1):
+        self.vocabulary = vocabulary
+        self._random = random.Random(seed)
+
+        # skumulowane wagi liczone raz, random.choices z cum_weights nie sumuje ich przy każdym losowaniu
+        self._cum_weights = list(itertools.accumulate(1 / rank for rank in range(1, len(vocabulary) + 1)))
+
+    def seed(self, value):
+        '''Ustawia ziarno losowania, ten sam tekst można wygenerować ponownie bez liczenia wag.'''
+        self._random.seed(value)
+
+    def words(self, count):
+        return self._random.choices(self.vocabulary, cum_weights=self._cum_weights, k=count)
+
+    def title(self):
+        return ' '.join(self.words(self._random.randint(4, 12))).capitalize()
+
+    def summary(self, min_words=30, max_words=120):
+        '''Treść HTML w stylu kanałów RSS: akapity, linki, pogrubienia.'''
+        words = self.words(self._random.randint(min_words, max_words))
+        paragraphs = []
+        for i in range(0, len(words), 20):
+            chunk = words[i:i + 20]
+            if len(chunk) > 3:
+                chunk[1] = f'<b>{chunk[1]}</b>'
+                chunk[-2] = f'<a href="https://example.com/{chunk[-2]}">{chunk[-2]}</a>'
+            paragraphs.append('<p>' + ' '.join(chunk) + '</p>')
+        return ''.join(paragraphs)
+
+    def choice(self, items):
+        return self._random.choice(items)
+
+    def randint(self, a, b):
+        return self._random.randint(a, b)
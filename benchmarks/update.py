@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+'''Benchmark "Update all": Updater pobiera kanały z lokalnego serwera (benchmarks/feedserver.py).
+
+Serwer działa w osobnym procesie, więc szczytowe RSS dotyczy tylko programu. Pierwsze
+uruchomienie pobiera wszystkie kanały, kolejne (--runs) korzystają z ETag / Last-Modified
+i dostają 304 dla kanałów które się nie zmieniły. Wyniki są zapisywane w JSON.
+
+    python3 benchmarks/update.py --channels 1000 --latency 0.2
+    python3 benchmarks/update.py --engine asyncio --jobs 200 --per-host 8 --compare threads.json
+'''
+import os
+import sys
+import json
+import time
+import sqlite3
+import resource
+import tempfile
+import argparse
+import platform
+import collections
+import multiprocessing
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import feedserver
+from com.bps.news.database import Database
+from com.bps.news.updater import Updater
+
+
+class TimedDatabase(Database):
+    '''Database sumująca czas metod wywoływanych w pętli zapisu Updater.
+
+    Odczyty (połączenie tylko do odczytu) są liczone osobno od zapisów.'''
+
+    WRITE_METHODS = (
+        'add_news', 'recommend_update_quality_ids', 'set_channel_cache',
+        'add_channel_history', 'set_channel_schedule', 'commit'
+    )
+    READ_METHODS = ('get_channel_history',)
+
+    def __init__(self, filename=None):
+        self.write_time = collections.Counter()
+        self.read_time = collections.Counter()
+        super().__init__(filename)
+
+
+def _timed(name, counter):
+    method = getattr(Database, name)
+
+    def wrapper(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            getattr(self, counter)[name] += time.perf_counter() - start
+
+    return wrapper
+
+
+for _name in TimedDatabase.WRITE_METHODS:
+    setattr(TimedDatabase, _name, _timed(_name, 'write_time'))
+for _name in TimedDatabase.READ_METHODS:
+    setattr(TimedDatabase, _name, _timed(_name, 'read_time'))
+
+
+def peak_rss():
+    '''Szczytowe RSS procesu w bajtach (ru_maxrss jest w KiB na Linuksie, w bajtach na macOS).'''
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def create_channels(db, port, args):
+    formats = args.formats.split(',')
+    for i in range(args.channels):
+        db.add_channel(f'Channel {i:05d}', feedserver.feed_url(port, args.hosts, i, formats[i % len(formats)]), 0)
+
+
+def run_update(db, args):
+    channels = db.get_channels()
+    totals = collections.Counter()
+
+    def on_progress(done, total, channels_stats):
+        for stats in channels_stats:
+            totals['new_items'] += stats.new_items
+            totals['errors'] += stats.error is not None
+            totals['not_modified'] += stats.not_modified
+
+    db.write_time.clear()
+    db.read_time.clear()
+    updater = Updater(db, channels, on_progress, jobs=args.jobs, per_host=args.per_host, engine=args.engine)
+
+    start = time.perf_counter()
+    updater.start()
+    updater.join()
+    wall_time = time.perf_counter() - start
+
+    write_time = dict(db.write_time)
+    read_time = dict(db.read_time)
+    return {
+        'channels': len(channels),
+        'wall_s': wall_time,
+        'channels_per_s': len(channels) / wall_time if wall_time else 0.0,
+        'new_items': totals['new_items'],
+        'not_modified': totals['not_modified'],
+        'errors': totals['errors'],
+        'db_write_s': sum(write_time.values()),
+        'db_write_s_by_method': write_time,
+        'db_read_s': sum(read_time.values()),
+        'db_read_s_by_method': read_time,
+        'peak_rss': peak_rss()
+    }
+
+
+def compare(runs, previous_file):
+    with open(previous_file) as f:
+        previous = json.load(f)['runs']
+
+    print(f'\ncompared with {previous_file}:')
+    for i, (before, after) in enumerate(zip(previous, runs)):
+        print(
+            f'run {i + 1}: wall {before["wall_s"]:.2f} s -> {after["wall_s"]:.2f} s, '
+            f'db write {before["db_write_s"]:.2f} s -> {after["db_write_s"]:.2f} s, '
+            f'peak RSS {before["peak_rss"] / 2**20:.0f} -> {after["peak_rss"] / 2**20:.0f} MiB'
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Update benchmark')
+    parser.add_argument('--channels', type=int, default=1000)
+    parser.add_argument('--formats', default='rss,atom,youtube', help='formaty kanałów przydzielane po kolei')
+    parser.add_argument('--runs', type=int, default=2, help='ilość kolejnych aktualizacji tej samej bazy')
+    parser.add_argument('--jobs', type=int, default=8)
+    parser.add_argument('--per-host', type=int, default=2)
+    parser.add_argument('--engine', choices=(Updater.ENGINE_THREADS, Updater.ENGINE_ASYNCIO), default=Updater.ENGINE_THREADS)
+    parser.add_argument('--database', help='plik bazy, domyślnie plik tymczasowy usuwany po pomiarach')
+    parser.add_argument('--output', default='update-benchmark.json', help='plik JSON z wynikami')
+    parser.add_argument('--compare', help='plik JSON z poprzedniego uruchomienia')
+    feedserver.add_arguments(parser)
+    args = parser.parse_args()
+
+    temp_dir = None
+    filename = args.database
+    if filename is None:
+        temp_dir = tempfile.TemporaryDirectory(prefix='news-benchmark-')
+        filename = os.path.join(temp_dir.name, 'news.sqlite3')
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(filename + suffix):
+            os.remove(filename + suffix)
+
+    connection, server_connection = multiprocessing.Pipe()
+    server = multiprocessing.Process(target=feedserver.serve, args=(args, server_connection), daemon=True)
+    server.start()
+    server_stats = None
+    runs = []
+    try:
+        port = connection.recv()
+        print(f'feed server on port {port}, {args.hosts} hosts, latency {args.latency} s')
+
+        Database.create_new(filename)
+        db = TimedDatabase(filename)
+        try:
+            create_channels(db, port, args)
+            for i in range(args.runs):
+                result = run_update(db, args)
+                runs.append(result)
+                print(
+                    f'run {i + 1}: {result["channels"]} channels in {result["wall_s"]:.2f} s '
+                    f'({result["channels_per_s"]:.1f}/s), new {result["new_items"]}, '
+                    f'not modified {result["not_modified"]}, errors {result["errors"]}, '
+                    f'db write {result["db_write_s"]:.2f} s, db read {result["db_read_s"]:.2f} s, peak RSS {result["peak_rss"] / 2**20:.0f} MiB'
+                )
+        finally:
+            db.close()
+
+        connection.send('stop')
+        server_stats = connection.recv()
+        print(f'server: {server_stats}')
+    finally:
+        server.join(5)
+        if server.is_alive():
+            server.terminate()
+        file_size = os.path.getsize(filename) if os.path.exists(filename) else None
+        if temp_dir is not None:
+            temp_dir.cleanup()
+
+    report = {
+        'meta': {
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'args': vars(args)
+        },
+        'server': server_stats,
+        'file_size': file_size,
+        'runs': runs
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'results saved to {args.output}')
+
+    if args.compare:
+        compare(runs, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,543 @@
+import time
+import errno
+import os.path
+import subprocess
+import webbrowser
+import gi
+gi.require_version('Gtk', '3.0')
+from gi.repository import Gtk
+from gi.repository import Gdk
+from gi.repository import GObject
+from gi.repository import GLib
+from com.bps.news.resources import resource
+from com.bps.news.viewer import StreamlinkViewer
+import com.bps.news.ui
+from com.bps.news.ui import WaitDialog
+import com.bps.news
+import com.bps.news.database
+import com.bps.news.maintenance
+import com.bps.news.metrics
+import com.bps.news.prefetch
+import com.bps.news.parentalctrl
+from com.bps.news.startup import timer
+
+
+class App(Gtk.Window):
+    # sekundy od startu do pierwszego czyszczenia i pomiędzy kolejnymi
+    RETENTION_DELAY = 60
+    RETENTION_PERIOD = 6 * 60 * 60
+
+    # ilość kanałów dodawanych do drzewa w jednym wywołaniu procedury idle
+    LOAD_CHANNELS_CHUNK = 200
+
+    def __init__(self):
+        super().__init__(Gtk.WindowType.TOPLEVEL, 'News')
+        self.set_title('News')
+        self._progress_dialog = None
+        self._updater = None
+        self._retention_job = None
+        self._search_timeout_id = None
+        self.connect('destroy', self._on_destroy)
+        self.connect('key-press-event', self._on_key_press)
+
+        self._wait_dlg = WaitDialog(self)
+
+        # otworzenie / utworzenie pliku bazy danych
+        database_file = com.bps.news.database.DEFAULT_DATABASE_FILE
+        self._db = com.bps.news.database.Database()
+        if not os.path.isfile(database_file):
+            self._db.create_new(database_file)
+        self._db.open_file(database_file)
+        self._next_queue = com.bps.news.prefetch.NewsQueue(self._db)
+        timer.mark('database')
+
+        vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
+
+        # menubar
+        accel_group = Gtk.AccelGroup()
+        self.add_accel_group(accel_group)
+
+        menubar = Gtk.MenuBar()
+        vbox.pack_start(menubar, False, False, 0)
+
+        # News menu
+        app_menu_item = Gtk.MenuItem('News')
+        app_menu = Gtk.Menu()
+        app_menu_item.set_submenu(app_menu)
+        menubar.append(app_menu_item)
+
+        self._update_all_item = Gtk.MenuItem('Update all')
+        key, mod = Gtk.accelerator_parse("<Control>U")
+        self._update_all_item.add_accelerator("activate", accel_group, key, mod, Gtk.AccelFlags.VISIBLE)
+        self._update_all_item.connect('activate', self._on_update_all_item)
+        app_menu.append(self._update_all_item)
+
+        self._update_due_item = Gtk.MenuItem('Update due')
+        key, mod = Gtk.accelerator_parse("<Control><Shift>U")
+        self._update_due_item.add_accelerator("activate", accel_group, key, mod, Gtk.AccelFlags.VISIBLE)
+        self._update_due_item.connect('activate', self._on_update_due_item)
+        app_menu.append(self._update_due_item)
+
+        retention_item = Gtk.MenuItem('Retention')
+        retention_item.connect('activate', self._on_retention_item)
+        app_menu.append(retention_item)
+
+        update_metrics_item = Gtk.MenuItem('Update statistics')
+        update_metrics_item.connect('activate', self._on_update_metrics_item)
+        app_menu.append(update_metrics_item)
+
+        quit_item = Gtk.MenuItem('Quit')
+        quit_item.connect('activate', self._on_quit_menu_item)
+        key, mod = Gtk.accelerator_parse("<Control>Q")
+        quit_item.add_accelerator("activate", accel_group, key, mod, Gtk.AccelFlags.VISIBLE)
+        app_menu.append(quit_item)
+
+        # channel menu
+        channel_menu_item = Gtk.MenuItem('Channel')
+        channel_menu = Gtk.Menu()
+        channel_menu_item.set_submenu(channel_menu)
+        menubar.append(channel_menu_item)
+
+        channel_add_item = Gtk.MenuItem('Add channel')
+        channel_add_item.connect('activate', self._on_channel_add_item)
+        key, mod = Gtk.accelerator_parse('<Control>N')
+        channel_add_item.add_accelerator('activate', accel_group, key, mod, Gtk.AccelFlags.VISIBLE)
+        channel_menu.append(channel_add_item)
+
+        folder_add_item = Gtk.MenuItem('Add folder')
+        folder_add_item.connect('activate', self._on_folder_add_item)
+        key, mod = Gtk.accelerator_parse('<Control><Shift>N')
+        folder_add_item.add_accelerator('activate', accel_group, key, mod, Gtk.AccelFlags.VISIBLE)
+        channel_menu.append(folder_add_item)
+
+        # news menu
+        news_menu_item = Gtk.MenuItem('News')
+        news_menu = Gtk.Menu()
+        news_menu_item.set_submenu(news_menu)
+        menubar.append(news_menu_item)
+
+        news_next_item = Gtk.MenuItem('Next')
+        news_next_item.connect('activate', self._on_news_next_item)
+        key, mod = Gtk.accelerator_parse('N')
+        news_next_item.add_accelerator('activate', accel_group, key, mod, Gtk.AccelFlags.VISIBLE)
+        news_menu.append(news_next_item)
+
+        news_goto_item = Gtk.MenuItem('Goto')
+        news_goto_item.connect('activate', self._on_news_goto_item)
+        key, mod = Gtk.accelerator_parse('G')
+        news_goto_item.add_accelerator('activate', accel_group, key, mod, Gtk.AccelFlags.VISIBLE)
+        news_menu.append(news_goto_item)
+
+        news_streamlink_worst = Gtk.MenuItem('Streamlink worst')
+        news_streamlink_worst.connect('activate', self._on_news_streamlink_worst)
+        key, mod = Gtk.accelerator_parse('1')
+        news_streamlink_worst.add_accelerator('activate', accel_group, key, mod, Gtk.AccelFlags.VISIBLE)
+        news_menu.append(news_streamlink_worst)
+
+        news_streamlink_360p = Gtk.MenuItem('Streamlink 360p')
+        news_streamlink_360p.connect('activate', self._on_news_streamlink_360p)
+        key, mod = Gtk.accelerator_parse('2')
+        news_streamlink_360p.add_accelerator('activate', accel_group, key, mod, Gtk.AccelFlags.VISIBLE)
+        news_menu.append(news_streamlink_360p)
+
+        news_mark_read_all = Gtk.MenuItem('Mark all as read')
+        news_mark_read_all.connect('activate', self._on_mark_all_read)
+        key, mod = Gtk.accelerator_parse('<Control>M')
+        news_mark_read_all.add_accelerator('activate', accel_group, key, mod, Gtk.AccelFlags.VISIBLE)
+        news_menu.append(news_mark_read_all)
+
+        news_search_item = Gtk.MenuItem('Search')
+        news_search_item.connect('activate', self._on_news_search_item)
+        key, mod = Gtk.accelerator_parse('<Control>F')
+        news_search_item.add_accelerator('activate', accel_group, key, mod, Gtk.AccelFlags.VISIBLE)
+        news_menu.append(news_search_item)
+
+        # help menu
+        help_menu_item = Gtk.MenuItem('Help')
+        help_menu = Gtk.Menu()
+        help_menu_item.set_submenu(help_menu)
+        menubar.append(help_menu_item)
+
+        about_menu_item = Gtk.MenuItem('About')
+        about_menu_item.connect('activate', self._on_about_item)
+        help_menu.append(about_menu_item)
+
+        paned = Gtk.Paned(orientation=Gtk.Orientation.HORIZONTAL)
+        vbox.pack_start(paned, True, True, 0)
+
+        # lewy panel
+        self._channel_viewer = com.bps.news.ui.ChannelViewer(
+            self._on_channel_activate,
+            self._on_delete_channel_item,
+            self._on_dragdrop_channel,
+            self._on_folder_toggle
+        )
+        paned.pack1(self._channel_viewer, False, False)
+
+        # prawy panel
+        l_paned = Gtk.Paned(orientation=Gtk.Orientation.VERTICAL)
+        news_box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
+        self._search_entry = Gtk.SearchEntry()
+        self._search_entry.connect('search-changed', self._on_search_changed)
+        news_box.pack_start(self._search_entry, False, False, 0)
+        self._news_list_box = com.bps.news.ui.NewsListView(self._on_note_activated)
+        news_box.pack_start(self._news_list_box, True, True, 0)
+        l_paned.pack1(news_box, False, False)
+
+        self._news_viewer = com.bps.news.ui.NewsViewer(on_click=self._on_news_view, on_like=self._on_like_click)
+        l_paned.pack2(self._news_viewer, True, False)
+        paned.pack2(l_paned, True, False)
+
+        self.add(vbox)
+
+        self.show_all()
+
+        # załadowanie konfiguracji i styli
+        self._load_config()
+        timer.mark('window')
+
+        # drzewo kanałów jest wypełniane po pokazaniu okna
+        if timer.enabled:
+            self._draw_handler = self.connect('draw', self._on_first_draw)
+        channels_loader = self._load_channels()
+        GLib.idle_add(lambda: next(channels_loader, False))
+
+        # usuwanie starych przeczytanych newsów chwilę po starcie i potem okresowo
+        GLib.timeout_add_seconds(self.RETENTION_DELAY, self._on_retention_timeout)
+
+    def _on_first_draw(self, widget, cr):
+        self.disconnect(self._draw_handler)
+        timer.mark('first paint')
+        return False
+
+    def _load_channels(self):
+        '''Wypełnia drzewo kanałów porcjami, kolejne porcje w kolejnych wywołaniach procedury idle.'''
+        folders = self._db.get_folders()
+        for folder in folders:
+            self._channel_viewer.add_folder(folder['title'])
+
+        for i, channel in enumerate(self._db.get_channels(), 1):
+            # wybierz ikonę odpowiednią do źródła newsów
+            icon = 'rss'
+            if 'youtube' in channel['url']:
+                icon = 'youtube'
+            elif 'twitch' in channel['url']:
+                icon = 'twitch'
+
+            self._channel_viewer.add_channel(channel['title'], channel['unread_count'], channel['folder_title'], icon_name=icon)
+
+            # oddaj sterowanie pętli GTK
+            if i % self.LOAD_CHANNELS_CHUNK == 0:
+                yield True
+
+        # rozwin katalogi jeśli trzeba
+        for folder in folders:
+            self._channel_viewer.toggle_folder(folder['title'], folder['expanded'])
+
+        timer.mark('channel tree')
+        timer.report()
+
+    def _on_key_press(self, widget, event):
+        # pole wyszukiwania dostaje klawisze przed skrótami jednoklawiszowymi (N, G, 1, 2)
+        if self._search_entry.is_focus() and not event.state & Gdk.ModifierType.CONTROL_MASK:
+            return self.propagate_key_event(event)
+        return False
+
+    def _on_news_search_item(self, e):
+        self._search_entry.grab_focus()
+
+    def _on_search_changed(self, entry):
+        # odczekaj aż użytkownik przestanie pisać
+        if self._search_timeout_id is not None:
+            GLib.source_remove(self._search_timeout_id)
+        self._search_timeout_id = GLib.timeout_add(200, self._on_search_timeout)
+
+    def _on_search_timeout(self):
+        self._search_timeout_id = None
+        text = self._search_entry.get_text().strip()
+
+        # puste pole - wróć do listy newsów zaznaczonego kanału
+        if not text:
+            channel_title = self._channel_viewer.get_selected_title()
+            if channel_title:
+                self._on_channel_activate(channel_title)
+            else:
+                self._news_list_box.clear_news()
+            return False
+
+        # wyniki wyszukiwania mają własny limit, wczytaj je jedną porcją
+        results = self._db.search_news(text)
+        self._news_list_box.load_news(lambda last_row, limit: results if last_row is None else [])
+
+        return False
+
+    def _on_mark_all_read(self, e):
+        self._db.set_all_as_read()
+        self._next_queue.invalidate()
+        self._news_list_box.clear_news()
+        self._channel_viewer.clear_news_count()
+
+    def _on_like_click(self, news_title, news_content):
+        news_channel = self._channel_viewer.get_selected_channel()[0]
+        text = f'{news_channel} {news_title} {news_content}'.lower()
+
+        r = self._db.recommend_count_words(text)
+        self._db.recommend_update_words(r)
+        self._db.recommend_update_quality_words([word for word, count in r])
+        self._db.commit()
+
+        # zmieniły się oceny, kolejność następnych newsów jest nieaktualna
+        self._next_queue.invalidate()
+
+    def _on_news_streamlink_worst(self, e):
+        url = self._news_viewer.get_url()
+        if url:
+            self._run_in_streamlink(url, 'worst')
+
+    def _on_news_streamlink_360p(self, e):
+        url = self._news_viewer.get_url()
+        if url:
+            self._run_in_streamlink(url, '360p')
+
+    def _on_progress_cancel(self):
+        self._updater.cancel()
+
+    def _on_about_item(self, e):
+        dlg = com.bps.news.ui.AboutDialog(self)
+        dlg.run()
+        dlg.destroy()
+
+    def _on_folder_toggle(self, expanding, folder_title):
+        self._db.set_folder_expanded(folder_title, expanding)
+
+    def _on_dragdrop_channel(self, channel_title, folder_title):
+        self._db.move_channel(channel_title, folder_title)
+
+    def _on_channel_activate(self, channel_title):
+        # wyświetl nieprzeczytane newsy z tego kanału w panelu newsów
+        self._load_channel_news(channel_title)
+
+    def _load_channel_news(self, channel_title):
+        # kolejne porcje są doczytywane przy przewijaniu listy
+        def loader(last_row, limit):
+            after = None if last_row is None else (last_row['quality'], last_row['id'])
+            return self._db.get_news(channel_title, after, limit)
+
+        self._news_list_box.load_news(loader)
+
+    def _on_news_goto_item(self, e):
+        url = self._news_viewer.get_url()
+        if url:
+            self.goto(url)
+
+    def _on_news_view(self, url, button):
+        self.goto(url, button)
+
+    def goto(self, url, button=1):
+        if button == 1:
+            webbrowser.open_new_tab(url)
+        elif button == 2:
+            self._run_in_streamlink(url, 'worst')
+        elif button == 3:
+            self._run_in_streamlink(url, '360p')
+
+    def _run_in_streamlink(self, url, quality='worst'):
+        self._wait_dlg.show()
+        v = StreamlinkViewer(url, quality, on_start=self._wait_dlg.hide)
+        v.start()
+
+    def _on_note_activated(self, news_id):
+        news = self._db.get_news_from_id(news_id)
+        self._news_viewer.set_news(news['title'], news['url'], news['text'], news['quality'])
+
+    def _on_news_next_item(self, e):
+        # news o największej jakości, z kolejki przygotowanej w tle
+        news = self._next_queue.pop()
+        if news is None:
+            return False
+
+        # zaznacz kanał do jakiego należy ten news
+        channel_name = self._channel_viewer.select_channel(news['channel_title'])
+        if not channel_name:
+            # news zostaje w kolejce, nie jest jeszcze przeczytany
+            self._next_queue.push_back(news)
+            return False
+
+        # ustaw newsy na liście newsów dla kanalu
+        self.set_channel(channel_name)
+
+        # przekaż focus do kontrolki z listą newsów
+        # aby upewnić się że zaznaczenie będzie widoczne
+        self._news_list_box.grab_focus()
+
+        # zaznacz news na liście
+        self._news_list_box.select_news(news['id'])
+
+        # ustaw news w przeglądarce newsów
+        self._news_viewer.set_news(news['title'], news['url'], news['text'], news['quality'])
+
+        # oznacz jako przeczytany dopiero po wczytaniu listy kanału, aby news na niej był
+        self._next_queue.mark_as_read(news['id'])
+        self._news_list_box.mark_as_read(news)
+        self._channel_viewer.dec_unread_count(channel_name)
+
+    def set_channel(self, channel_title):
+        self._channel_viewer.select_channel(channel_title)
+
+        # wyświetl listę notatek na liście notatek
+        self._load_channel_news(channel_title)
+
+    def _on_delete_channel_item(self, channel_title):
+        result = False
+
+        dlg = Gtk.MessageDialog(self, 0, Gtk.MessageType.QUESTION, Gtk.ButtonsType.OK_CANCEL, 'Czy usunąć kanał?')
+        if dlg.run() == Gtk.ResponseType.OK:
+            self._db.remove_channel(channel_title)
+            self._next_queue.invalidate()
+            result = True
+
+        dlg.destroy()
+        return result
+
+    def _on_folder_add_item(self, e):
+        dlg = com.bps.news.ui.FolderDialog(self)
+        if dlg.run() == Gtk.ResponseType.OK:
+            data = dlg.get_data()
+            if data:
+                if self._db.add_folder(data['title']):
+                    self._channel_viewer.add_folder(data['title'])
+
+        dlg.destroy()
+
+    def _on_channel_add_item(self, e):
+        dlg = com.bps.news.ui.ChannelDialog(self)
+        if dlg.run() == Gtk.ResponseType.OK:
+            data = dlg.get_data()
+            if data:
+                if self._db.add_channel(data['title'], data['url'], data['channel_type']):
+                    icon = 'rss'
+                    if 'youtube' in data['url']:
+                        icon = 'youtube'
+                    elif 'twitch' in data['url']:
+                        icon = 'twitch'
+
+                    self._channel_viewer.add_channel(data['title'], 0, icon_name=icon)
+
+        dlg.destroy()
+
+    def _on_update_all_item(self, e):
+        self._start_update(self._db.get_channels())
+
+    def _on_update_due_item(self, e):
+        # tylko kanały których termin aktualizacji już minął
+        self._start_update(self._db.get_channels_due(time.time()))
+
+    def _start_update(self, channels):
+        self._update_all_item.set_sensitive(False)
+        self._update_due_item.set_sensitive(False)
+        self._progress_dialog = com.bps.news.ui.ProgressDialog(self, self._on_progress_cancel)
+        self._progress_dialog.show()
+
+        # wywołania zwrotne wykonuje pętla GTK
+        import com.bps.news.updater
+        self._updater = com.bps.news.updater.Updater(self._db, channels, self._on_update_progress, self._on_update_end, dispatch=GObject.idle_add)
+        self._updater.start()
+
+    def _on_update_progress(self, done, total, channels_stats):
+        lines = []
+        for stats in channels_stats:
+            if stats.error:
+                lines.append(f'Kanał {stats.title}: błąd {stats.error} ({stats.duration:.1f} s)')
+            elif stats.not_modified:
+                lines.append(f'Kanał {stats.title} bez zmian ({stats.duration:.1f} s)')
+            else:
+                lines.append(f'Kanał {stats.title}: nowych {stats.new_items} ({stats.duration:.1f} s)')
+
+        self._progress_dialog.set_position(done / total)
+        self._progress_dialog.add_log(lines)
+
+    def _on_update_end(self):
+        print(f'Update finished in {self._updater.duration:.1f} s; channels not modified: {self._updater.not_modified_count}')
+
+        # nowe newsy i przeliczone oceny
+        self._next_queue.invalidate()
+
+        self._update_unread_count()
+        self._update_all_item.set_sensitive(True)
+        self._update_due_item.set_sensitive(True)
+
+        # avoid crash
+        GObject.idle_add(lambda: self._progress_dialog.destroy())
+
+    def _on_retention_timeout(self):
+        GLib.timeout_add_seconds(self.RETENTION_PERIOD, self._start_retention)
+        self._start_retention()
+        return False
+
+    def _start_retention(self):
+        # poprzednie czyszczenie jeszcze trwa
+        if self._retention_job is None or not self._retention_job.is_alive():
+            self._retention_job = com.bps.news.maintenance.RetentionJob(self._db, on_end=self._on_retention_end)
+            self._retention_job.start()
+        return True
+
+    def _on_retention_end(self, purged_count):
+        if purged_count:
+            print(f'Retention finished; read news purged: {purged_count}')
+
+    def _on_retention_item(self, e):
+        dlg = com.bps.news.ui.RetentionDialog(self)
+        dlg.set_data({'days': com.bps.news.maintenance.RetentionJob.get_retention_days(self._db)})
+        if dlg.run() == Gtk.ResponseType.OK:
+            data = dlg.get_data()
+            self._db.set_setting(com.bps.news.maintenance.RetentionJob.RETENTION_DAYS_KEY, data['days'])
+            self._start_retention()
+
+        dlg.destroy()
+
+    def _on_update_metrics_item(self, e):
+        dlg = com.bps.news.ui.UpdateMetricsDialog(self, com.bps.news.metrics.get_report(self._db))
+        dlg.run()
+        dlg.destroy()
+
+    def _update_unread_count(self):
+        # uaktualnij ilość nieprzeczytanych we wszystkich kanałach
+        self._channel_viewer.set_channels_unread(dict(self._db.get_news_count()))
+
+    def _on_quit_menu_item(self, e):
+        self._quit()
+
+    def _on_destroy(self, e=None):
+        self._quit()
+
+    def _load_config(self):
+        css_provider = Gtk.CssProvider.new()
+        css_provider.load_from_data(b'* { font-size: 14pt; }')
+        Gtk.StyleContext.add_provider_for_screen(self.get_window().get_screen(), css_provider, Gtk.STYLE_PROVIDER_PRIORITY_USER)
+
+    def _quit(self):
+        Gtk.main_quit()
+
+    def run(self):
+        if not com.bps.news.parentalctrl.check_parental_control():
+            # inform user why program will be closed
+            dlg = com.bps.news.parentalctrl.DisallowedDialog(self)
+            dlg.run()
+            dlg.destroy()
+
+            return
+
+        Gdk.threads_init()
+        Gdk.threads_enter()
+        Gtk.main()
+        Gdk.threads_leave()
+
+        # zatrzymaj aktualizację i czyszczenie, dopiero potem zamknij bazę,
+        # inaczej ich zapisy trafiłyby do zamkniętej bazy
+        if self._updater is not None:
+            self._updater.cancel()
+            self._updater.join()
+        if self._retention_job is not None:
+            self._retention_job.cancel()
+            self._retention_job.join()
+        self._db.close()
@@ -0,0 +1,153 @@
+# pierwszy import - od niego liczony jest czas uruchamiania
+from com.bps.news.startup import timer
+import os.path
+import sys
+import time
+import argparse
+import com.bps.news.database
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='news', description='Yet another RSS reader.')
+    parser.add_argument('--update', action='store_true', help='aktualizuj kanały bez otwierania okna')
+    parser.add_argument('--due-only', action='store_true', help='tylko kanały których termin aktualizacji minął')
+    parser.add_argument('--jobs', type=int, default=8, help='ilość jednoczesnych pobierań')
+    parser.add_argument('--per-host', type=int, default=2, help='limit jednoczesnych połączeń do jednego hosta')
+    # Updater.ENGINE_THREADS / ENGINE_ASYNCIO, moduł aktualizacji nie jest importowany przy starcie okna
+    parser.add_argument('--engine', choices=('threads', 'asyncio'), default='threads', help='sposób pobierania kanałów')
+    parser.add_argument('--database', default=com.bps.news.database.DEFAULT_DATABASE_FILE, help='plik bazy danych')
+    parser.add_argument('--quiet', action='store_true', help='nie wypisuj wyników kanałów')
+    parser.add_argument('--compact', action='store_true', help='jednorazowo przełącz starszy plik bazy na zmniejszanie się po usunięciu newsów (VACUUM całego pliku)')
+    parser.add_argument('--metrics', action='store_true', help='pokaż pomiary ostatniej aktualizacji bez aktualizowania')
+    parser.add_argument('--slowest', type=int, default=10, help='ilość najwolniejszych kanałów w podsumowaniu aktualizacji')
+    parser.add_argument('--metrics-json', metavar='FILE', help='zapisz pomiary aktualizacji w pliku JSON')
+    parser.add_argument('--metrics-prometheus', metavar='FILE', help='zapisz pomiary aktualizacji w formacie Prometheus (textfile collector)')
+    return parser.parse_args(argv)
+
+
+def open_database(filename):
+    db = com.bps.news.database.Database()
+    if not os.path.isfile(filename):
+        db.create_new(filename)
+    db.open_file(filename)
+    return db
+
+
+def show_metrics(db, args, run_id=None):
+    '''Wypisuje podsumowanie aktualizacji z najwolniejszymi kanałami i zapisuje pomiary do plików.'''
+    import com.bps.news.metrics
+
+    report = com.bps.news.metrics.get_report(db, run_id)
+    if report is None:
+        print('No update metrics yet.')
+        return 1
+
+    if not args.quiet or args.metrics:
+        for line in com.bps.news.metrics.format_report(report, args.slowest):
+            print(line)
+
+    if args.metrics_json:
+        com.bps.news.metrics.export_json(report, args.metrics_json)
+    if args.metrics_prometheus:
+        com.bps.news.metrics.export_prometheus(report, args.metrics_prometheus)
+    return 0
+
+
+def metrics(args):
+    db = open_database(args.database)
+    try:
+        return show_metrics(db, args)
+    finally:
+        db.close()
+
+
+def compact(args):
+    '''Przełącza plik na auto_vacuum = incremental, trwa tym dłużej im większy plik - uruchamiać przy zamkniętym oknie.'''
+    db = open_database(args.database)
+    try:
+        size = os.path.getsize(args.database)
+        start = time.perf_counter()
+        if db.enable_incremental_vacuum():
+            print(f'Database compacted in {time.perf_counter() - start:.1f} s; size: {size / 2**20:.0f} MiB -> {os.path.getsize(args.database) / 2**20:.0f} MiB')
+        else:
+            print('Database already uses incremental vacuum.')
+    finally:
+        db.close()
+    return 0
+
+
+def update(args):
+    '''Aktualizuje kanały w bieżącym wątku, bez GTK (np. z timera systemd).'''
+    import com.bps.news.updater
+
+    db = open_database(args.database)
+
+    totals = {'new_items': 0, 'errors': 0}
+
+    def on_progress(done, total, channels_stats):
+        for stats in channels_stats:
+            totals['new_items'] += stats.new_items
+            totals['errors'] += stats.error is not None
+            if args.quiet:
+                continue
+
+            if stats.error:
+                status = f'error: {stats.error}'
+            elif stats.not_modified:
+                status = 'not modified'
+            else:
+                status = f'{stats.new_items} new'
+            print(f'[{done}/{total}] {stats.title}: {status} ({stats.duration:.1f} s)')
+
+    try:
+        channels = db.get_channels_due(time.time()) if args.due_only else db.get_channels()
+        updater = com.bps.news.updater.Updater(
+            db, channels, on_progress,
+            jobs=args.jobs, per_host=args.per_host, engine=args.engine
+        )
+
+        start = time.perf_counter()
+        updater.start()
+        try:
+            # join z limitem czasu, aby Ctrl+C przerwał czekanie
+            while updater.is_alive():
+                updater.join(0.5)
+        except KeyboardInterrupt:
+            updater.cancel()
+            updater.join()
+            return 130
+
+        print(
+            f'Update finished in {time.perf_counter() - start:.1f} s; channels: {len(channels)}, '
+            f'new news: {totals["new_items"]}, not modified: {updater.not_modified_count}, errors: {totals["errors"]}'
+        )
+
+        if updater.run_id is not None:
+            show_metrics(db, args, updater.run_id)
+    finally:
+        db.close()
+
+    return 1 if totals['errors'] and totals['errors'] == len(channels) else 0
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.update:
+        return update(args)
+    if args.metrics:
+        return metrics(args)
+    if args.compact:
+        return compact(args)
+
+    # okno programu, GTK jest importowany dopiero tutaj
+    import com.bps.news
+    App = com.bps.news.App
+    timer.mark('imports')
+
+    app = App()
+    app.run()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
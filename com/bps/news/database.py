@@ -1,96 +1,707 @@
 import os
+import re
+import queue
 import os.path
+import pathlib
 import sqlite3
+import functools
+import threading
 import collections
+import concurrent.futures
+import com.bps.news.text
+import com.bps.news.scoring
+
+
+# plik bazy używany przez program okienkowy i aktualizację z wiersza poleceń
+DEFAULT_DATABASE_FILE = os.path.join(os.path.expanduser('~'), '.config/news', 'news.sqlite3')
+
+
+class DatabaseWriter(threading.Thread):
+    '''Jedyny wątek zapisujący do bazy, wykonuje kolejno zadania z kolejki.'''
+
+    def __init__(self):
+        super().__init__(name='DatabaseWriter', daemon=True)
+        self._queue = queue.Queue()
+        self._stop_lock = threading.Lock()
+        self._stopped = False
+
+    def submit(self, fn, *args, **kwargs):
+        # zadanie za znacznikiem końca nigdy by się nie wykonało, a czekający na nie wątek nie skończyłby się
+        with self._stop_lock:
+            if self._stopped:
+                raise sqlite3.ProgrammingError('Database is closed')
+
+            future = concurrent.futures.Future()
+            self._queue.put((future, fn, args, kwargs))
+        return future
+
+    def stop(self):
+        with self._stop_lock:
+            self._stopped = True
+            self._queue.put(None)
+        self.join()
+
+    def run(self):
+        for future, fn, args, kwargs in iter(self._queue.get, None):
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+
+def writes(method):
+    '''Metoda zapisująca do bazy - wykonywana w wątku DatabaseWriter na połączeniu do zapisu.'''
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        # wywołanie z innej metody zapisującej, jesteśmy już w wątku zapisującym
+        if threading.current_thread() is self._writer:
+            return method(self, *args, **kwargs)
+
+        return _submit(self, method, *args, **kwargs).result()
+
+    return wrapper
+
+
+def writes_async(method):
+    '''Jak writes, ale nie czeka na wykonanie - zwraca Future.'''
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if threading.current_thread() is self._writer:
+            future = concurrent.futures.Future()
+            future.set_result(method(self, *args, **kwargs))
+            return future
+
+        return _submit(self, method, *args, **kwargs)
+
+    return wrapper
+
+
+def _submit(database, method, *args, **kwargs):
+    writer = database._writer
+    if writer is None:
+        raise sqlite3.ProgrammingError('Database is closed')
+    return writer.submit(method, database, *args, **kwargs)
 
 
 class Database:
+    '''Baza newsów w trybie WAL.
+
+    Zapisy wykonuje jeden wątek DatabaseWriter (self._connection, self._cursor są używane tylko w nim),
+    odczyty idą przez osobne połączenie tylko do odczytu (self._reader), więc nie czekają na zapisy.'''
+
+    SEARCH_RANK_LIMIT = 5000
+    ADD_NEWS_CHUNK = 500
+
+    # ilość ostatnich aktualizacji których pomiary są przechowywane
+    UPDATE_RUNS_KEEP = 20
+
+    # kolumny newsa bez spakowanego HTML (summary)
+    NEWS_COLUMNS = 'news.id, news.channel_id, news.title, news.url, news.text, news.is_read, news.quality'
+
     def __init__(self, filename=None):
-        self._connection = None
+        self._writer = None
+        self._reader = None
+
+        # word -> words.id, channel.title -> channel.id
+        self._word_ids = {}
+        self._channel_ids = {}
 
         if isinstance(filename, str):
             self.open_file(filename)
 
     def open_file(self, filename):
         # zamknij plik jeśli bł otwarty
-        if self._connection:
+        if self._writer:
             self.close()
 
-        self._connection = sqlite3.connect(filename, check_same_thread=False)
+        self._writer = DatabaseWriter()
+        self._writer.start()
+        self._open_writer(filename)
+
+        # połączenie do odczytu otwierane po migracjach
+        uri = pathlib.Path(filename).absolute().as_uri() + '?mode=ro'
+        self._reader_connection = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        self._reader_connection.row_factory = sqlite3.Row
+        self._reader = self._reader_connection.cursor()
+        self._read_lock = threading.RLock()
+
+    @writes
+    def _open_writer(self, filename):
+        self._connection = sqlite3.connect(filename)
         self._connection.row_factory = sqlite3.Row
         self._cursor = self._connection.cursor()
+        self._word_ids = {}
+        self._channel_ids = {}
+
+        # nowy plik od razu z auto_vacuum, aby usuwanie starych newsów zmniejszało plik
+        if self._cursor.execute('pragma page_count').fetchone()[0] == 0:
+            self._cursor.execute('pragma auto_vacuum = incremental')
+
+        # czytelnicy nie blokują zapisu i odwrotnie, commit bez fsync (tylko przy checkpoint)
+        self._cursor.execute('pragma journal_mode = wal')
+        self._cursor.execute('pragma synchronous = normal')
+
+        # tworzony przy pierwszym użyciu, patrz _get_scorer
+        self._scorer = None
+
+        self._migrate()
+
+    @writes
+    def _close_writer(self):
+        self._connection.commit()
+        self._connection.execute('pragma optimize')
+        self._connection.close()
+
+    def _read(self, sql, params=()):
+        with self._read_lock:
+            return self._reader.execute(sql, params).fetchall()
+
+    def _read_one(self, sql, params=()):
+        with self._read_lock:
+            return self._reader.execute(sql, params).fetchone()
+
+    def _migrate(self):
+        '''Aktualizuje schemat pliku bazy danych, wersja schematu jest zapisana w PRAGMA user_version.'''
+        migrations = [
+            self._migration_1_base_schema,
+            self._migration_2_news_indexes,
+            self._migration_3_unread_count,
+            self._migration_4_retention,
+            self._migration_5_news_text,
+            self._migration_6_update_metrics
+        ]
+
+        version = self._cursor.execute('pragma user_version').fetchone()[0]
+        for version, migration in enumerate(migrations[version:], version + 1):
+            # każda migracja w osobnej transakcji razem z numerem wersji
+            self._cursor.execute('begin')
+            try:
+                migration()
+                self._cursor.execute(f'pragma user_version = {version}')
+            except:
+                self._connection.rollback()
+                raise
+            self._connection.commit()
+
+    def _migration_1_base_schema(self):
+        '''Tworzy schemat nowego pliku lub uzupełnia pliki sprzed wersjonowania (install.sql, stare create_new).'''
+        self._cursor.execute('''
+            create table if not exists folder(
+                id integer primary key autoincrement,
+                title varchar(100) not null unique,
+                expanded boolean not null default 0
+            )
+        ''')
+        self._cursor.execute('''
+            create table if not exists channel(
+                id integer primary key autoincrement,
+                title varchar(100) not null,
+                url varchar(512) not null,
+                folder_id integer,
+                channel_type integer default 0,
+                foreign key (folder_id) references folder(id)
+            )
+        ''')
+        self._cursor.execute('''
+            create table if not exists news(
+                id integer primary key autoincrement,
+                channel_id int not null,
+                title varchar(256) not null,
+                url varchar(512) not null unique,
+                summary text not null,
+                is_read boolean default 0,
+                quality int not null default 0,
+                foreign key (channel_id) references channel(id)
+            )
+        ''')
+
+        # kolumny których brakowało w plikach tworzonych przez create_new
+        self._add_column_if_missing('channel', 'channel_type', 'integer default 0')
+        self._add_column_if_missing('news', 'quality', 'int not null default 0')
+
+        # dane do zapytań warunkowych GET (ETag / Last-Modified)
+        self._add_column_if_missing('channel', 'etag', 'varchar(255)')
+        self._add_column_if_missing('channel', 'last_modified', 'varchar(64)')
+
+        # harmonogram aktualizacji kanałów
+        self._add_column_if_missing('channel', 'update_interval', 'integer')
+        self._add_column_if_missing('channel', 'next_update', 'integer not null default 0')
+        self._cursor.execute('''
+            create table if not exists channel_history(
+                id integer primary key autoincrement,
+                channel_id integer not null,
+                updated_at integer not null,
+                new_items integer not null default 0,
+                foreign key (channel_id) references channel(id)
+            )
+        ''')
+        self._cursor.execute('create index if not exists channel_history_channel_idx on channel_history(channel_id, updated_at)')
+
+        # rekomendacje
+        self._cursor.execute('''
+            create table if not exists words(
+                id integer primary key autoincrement,
+                word varchar(255) not null unique,
+                weight int not null default 0,
+                use boolean default 1
+            )
+        ''')
+
+
+    def _migration_2_news_indexes(self):
+        '''Indeksy pod zapytania filtrujące po is_read, channel_id i sortujące po quality.'''
+        # get_news_next bez kanału, get_news_count
+        self._cursor.execute('create index if not exists news_unread_quality_idx on news(is_read, quality)')
+
+        # get_news, get_news_next dla kanału, liczniki nieprzeczytanych w get_channels
+        self._cursor.execute('create index if not exists news_channel_unread_idx on news(channel_id, is_read, quality)')
+
+        # wyszukiwanie kanałów po tytule
+        self._cursor.execute('create index if not exists channel_title_idx on channel(title)')
+        self._cursor.execute('analyze')
+
+    def _migration_3_unread_count(self):
+        '''Licznik nieprzeczytanych newsów w kanale, aktualizowany przez wyzwalacze.'''
+        self._add_column_if_missing('channel', 'unread_count', 'integer not null default 0')
+        self._cursor.execute('update channel set unread_count = (select count(id) from news where channel_id = channel.id and is_read = 0)')
+
+        self._cursor.execute('''
+            create trigger if not exists news_unread_insert after insert on news when new.is_read = 0
+            begin
+                update channel set unread_count = unread_count + 1 where id = new.channel_id;
+            end
+        ''')
+        self._cursor.execute('''
+            create trigger if not exists news_unread_delete after delete on news when old.is_read = 0
+            begin
+                update channel set unread_count = unread_count - 1 where id = old.channel_id;
+            end
+        ''')
+        self._cursor.execute('''
+            create trigger if not exists news_unread_update after update of is_read, channel_id on news
+            when old.is_read is not new.is_read or old.channel_id is not new.channel_id
+            begin
+                update channel set unread_count = unread_count - 1 where id = old.channel_id and old.is_read = 0;
+                update channel set unread_count = unread_count + 1 where id = new.channel_id and new.is_read = 0;
+            end
+        ''')
+
+    def _migration_4_retention(self):
+        '''Czas przeczytania newsa, adresy usuniętych newsów oraz ustawienia programu.'''
+        self._add_column_if_missing('news', 'read_at', 'integer')
+
+        # przeczytane newsy to większość pliku, aktualizuj je porcjami aby WAL nie rósł do rozmiaru bazy
+        last_id = 0
+        while True:
+            ids = [row['id'] for row in self._cursor.execute(
+                'select id from news where id > ? and is_read = 1 and read_at is null order by id limit ?',
+                (last_id, self.ADD_NEWS_CHUNK)
+            )]
+            if not ids:
+                break
+
+            self._cursor.execute(
+                f"update news set read_at = cast(strftime('%s', 'now') as integer) where id in ({','.join('?' * len(ids))})",
+                ids
+            )
+            self._commit_batch()
+            last_id = ids[-1]
+        self._cursor.execute('''
+            create trigger if not exists news_read_at after update of is_read on news
+            when new.is_read = 1 and old.is_read = 0
+            begin
+                update news set read_at = cast(strftime('%s', 'now') as integer) where id = new.id;
+            end
+        ''')
+        self._cursor.execute('create index if not exists news_read_at_idx on news(read_at) where is_read = 1')
+
+        # adresy usuniętych newsów, aby nie zostały ponownie dodane przy aktualizacji
+        self._cursor.execute('''
+            create table if not exists news_purged(
+                url varchar(512) not null primary key
+            ) without rowid
+        ''')
+
+        self._cursor.execute('''
+            create table if not exists settings(
+                key varchar(100) not null primary key,
+                value text
+            )
+        ''')
+
+    def _migration_5_news_text(self):
+        '''Tekst newsa wyciągnięty z HTML w osobnej kolumnie, oryginalny HTML spakowany.
+
+        Indeks słów i indeks pełnotekstowy są tworzone tutaj, od razu z tekstu. Istniejące newsy są
+        przetwarzane porcjami, każda w osobnej transakcji, aby WAL nie rósł do rozmiaru całej bazy;
+        przerwana migracja jest kontynuowana od newsów z jeszcze niespakowanym HTML.'''
+        self._add_column_if_missing('news', 'text', "text not null default ''")
+
+        # pliki z wersji rozwojowych mogą mieć indeksy zbudowane z HTML
+        for trigger in ('news_fts_insert', 'news_fts_delete', 'news_fts_update'):
+            self._cursor.execute(f'drop trigger if exists {trigger}')
+        self._cursor.execute('drop table if exists news_fts')
+        self._cursor.execute('drop table if exists news_word')
+        self._commit_batch()
+
+        last_id = 0
+        while True:
+            rows = self._cursor.execute(
+                "select id, summary from news where id > ? and typeof(summary) = 'text' order by id limit ?",
+                (last_id, self.ADD_NEWS_CHUNK)
+            ).fetchall()
+            if not rows:
+                break
+
+            self._cursor.executemany('update news set text = ?, summary = ? where id = ?', [
+                (com.bps.news.text.html_to_text(row['summary']), com.bps.news.text.compress(row['summary']), row['id'])
+                for row in rows
+            ])
+            self._commit_batch()
+            last_id = rows[-1]['id']
+
+        self._create_news_word_index()
+        self._create_news_fts()
+
+        # zaindeksuj istniejące newsy, słowa tylko nieprzeczytanych
+        last_id = 0
+        while True:
+            rows = self._cursor.execute('''
+                select news.id, news.title, news.text, news.is_read, channel.title as channel_title
+                from news
+                join channel on channel.id = news.channel_id
+                where news.id > ?
+                order by news.id
+                limit ?
+            ''', (last_id, self.ADD_NEWS_CHUNK)).fetchall()
+            if not rows:
+                break
+
+            self._cursor.executemany('insert into news_fts(rowid, title, text) values (?, ?, ?)', [
+                (row['id'], row['title'], row['text']) for row in rows
+            ])
+            self._index_news([
+                (row['id'], f"{row['channel_title']} {row['title']} {row['text']}") for row in rows if not row['is_read']
+            ])
+            self._commit_batch()
+            last_id = rows[-1]['id']
+
+    def _migration_6_update_metrics(self):
+        '''Pomiary aktualizacji: podsumowanie każdej aktualizacji i czasy poszczególnych kanałów.'''
+        self._cursor.execute('''
+            create table if not exists update_run(
+                id integer primary key,
+                started_at integer not null,
+                duration real not null,
+                engine varchar(20),
+                channels integer not null default 0,
+                new_items integer not null default 0,
+                not_modified integer not null default 0,
+                errors integer not null default 0,
+                bytes integer
+            )
+        ''')
+        self._cursor.execute('''
+            create table if not exists channel_metrics(
+                run_id integer not null,
+                channel_id integer not null,
+                connect_time real,
+                download_time real,
+                parse_time real,
+                fetch_time real not null default 0,
+                add_news_time real not null default 0,
+                scoring_time real not null default 0,
+                commit_time real not null default 0,
+                total_time real not null default 0,
+                bytes integer,
+                new_items integer not null default 0,
+                not_modified integer not null default 0,
+                error text,
+                primary key(run_id, channel_id)
+            ) without rowid
+        ''')
+
+    def _add_column_if_missing(self, table, column, definition):
+        columns = [row['name'] for row in self._cursor.execute(f'pragma table_info({table})')]
+        if column not in columns:
+            self._cursor.execute(f'alter table {table} add column {column} {definition}')
+
+    def _commit_batch(self):
+        # zatwierdza porcję długiej migracji i rozpoczyna kolejną transakcję
+        self._connection.commit()
+        self._cursor.execute('begin')
 
-        # sanitizers
+    def _create_news_fts(self):
+        # indeks FTS5 korzysta z treści tabeli news (external content), synchronizują go wyzwalacze
+        self._cursor.execute('''
+            create virtual table news_fts using fts5(
+                title,
+                text,
+                content='news',
+                content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2',
+                prefix='2 3'
+            )
+        ''')
+        self._cursor.execute('''
+            create trigger if not exists news_fts_insert after insert on news
+            begin
+                insert into news_fts(rowid, title, text) values (new.id, new.title, new.text);
+            end
+        ''')
+        self._cursor.execute('''
+            create trigger if not exists news_fts_delete after delete on news
+            begin
+                insert into news_fts(news_fts, rowid, title, text) values ('delete', old.id, old.title, old.text);
+            end
+        ''')
+        self._cursor.execute('''
+            create trigger if not exists news_fts_update after update of title, text on news
+            begin
+                insert into news_fts(news_fts, rowid, title, text) values ('delete', old.id, old.title, old.text);
+                insert into news_fts(rowid, title, text) values (new.id, new.title, new.text);
+            end
+        ''')
+
+    def _create_news_word_index(self):
+        self._cursor.execute('''
+            create table news_word(
+                news_id integer not null,
+                word_id integer not null,
+                count integer not null default 1,
+                primary key (news_id, word_id),
+                foreign key (news_id) references news(id),
+                foreign key (word_id) references words(id)
+            ) without rowid
+        ''')
+        self._cursor.execute('create index if not exists news_word_word_idx on news_word(word_id, news_id)')
+
+        # przeczytanych newsów się nie ocenia, nie trzymaj dla nich indeksu
+        self._cursor.execute('''
+            create trigger if not exists news_word_read after update of is_read on news when new.is_read = 1
+            begin
+                delete from news_word where news_id = new.id;
+            end
+        ''')
+        self._cursor.execute('''
+            create trigger if not exists news_word_delete after delete on news
+            begin
+                delete from news_word where news_id = old.id;
+            end
+        ''')
+
+    # sanitizers
 
     def _sanitize_title(self, title):
         return title.replace('\n', ' ')
 
+    def _select_channels(self, where='', params=(), order_by='channel.title'):
+        sql = f'''
+            select
+                channel.id,
+                channel.title,
+                channel.url,
+                channel.channel_type,
+                channel.unread_count,
+                folder.title as folder_title,
+                channel.etag,
+                channel.last_modified,
+                channel.update_interval,
+                channel.next_update
+            from channel
+            left join folder on folder.id = channel.folder_id
+            {where}
+            order by {order_by}
+        '''
+        return self._read(sql, params)
+
     def get_channels(self):
-        return self._cursor.execute('select channel.id, channel.title, channel.url, channel.channel_type, (select count(id) from news where channel_id = channel.id and is_read = 0) as unread_count, folder.title as folder_title from channel left join folder on folder.id = channel.folder_id order by channel.title').fetchall()
+        return self._select_channels()
+
+    def get_channels_due(self, now):
+        '''Zwraca kanały których termin aktualizacji już minął.'''
+        return self._select_channels('where channel.next_update <= ?', (now,), 'channel.next_update')
 
+    @writes
+    def add_channel_history(self, channel_id, updated_at, new_items, keep=20):
+        self._cursor.execute('insert into channel_history(channel_id, updated_at, new_items) values (?, ?, ?)', (channel_id, updated_at, new_items))
+
+        # przechowuj tylko ostatnie wpisy historii
+        self._cursor.execute('''
+            delete from channel_history
+            where channel_id = ? and id not in (
+                select id from channel_history where channel_id = ? order by updated_at desc, id desc limit ?
+            )
+        ''', (channel_id, channel_id, keep))
+
+    def get_channel_history(self, channel_id, limit=20):
+        return self._read('select updated_at, new_items from channel_history where channel_id = ? order by updated_at desc, id desc limit ?', (channel_id, limit))
+
+    @writes
+    def set_channel_schedule(self, channel_id, update_interval, next_update):
+        self._cursor.execute('update channel set update_interval = ?, next_update = ? where id = ?', (update_interval, next_update, channel_id))
+
+    @writes
     def add_channel(self, title, url, channel_type):
         self._cursor.execute('insert into channel(title, url, channel_type) values (?, ?, ?)', (title, url, channel_type))
         self._connection.commit()
         return True
 
+    @writes
     def remove_channel(self, channel_title):
+        self._channel_ids.pop(channel_title, None)
+        self._cursor.execute('delete from channel_history where channel_id in (select id from channel where title = ?)', (channel_title,))
+        self._cursor.execute('delete from channel_metrics where channel_id in (select id from channel where title = ?)', (channel_title,))
         self._cursor.execute('delete from channel where title = ?', (channel_title,))
         self._connection.commit()
         return True
 
+    @writes
     def move_channel(self, channel_title, folder_title):
         self._cursor.execute('update channel set folder_id = (select id from folder where title = ?) where title = ?', (folder_title, channel_title))
         self._connection.commit()
         return True
 
+    @writes
+    def set_channel_cache(self, channel_id, etag, last_modified):
+        self._cursor.execute('update channel set etag = ?, last_modified = ? where id = ?', (etag, last_modified, channel_id))
+
+    def _get_channel_id(self, channel_title):
+        channel_id = self._channel_ids.get(channel_title)
+        if channel_id is None:
+            channel_id = self._cursor.execute('select id from channel where title = ?', (channel_title,)).fetchone()[0]
+            self._channel_ids[channel_title] = channel_id
+        return channel_id
+
+    @writes
     def add_news(self, channel_title, news):
-        # get channel id
-        channel_id = self._cursor.execute('select id from channel where title = ?', (channel_title,)).fetchone()[0]
+        '''Dodaje wpisy do kanału, zwraca listę id faktycznie dodanych wpisów.
+
+        Wpisy o adresie który już jest w bazie są pomijane, wpisy bez adresu są ignorowane.'''
+        channel_id = self._get_channel_id(channel_title)
 
         # create list of values
         insert_values = []
         for d in news:
-            # sanityzuj tytuł
-            title = self._sanitize_title(d['title'])
-            insert_values.append((channel_id, title, d['link'], d['summary']))
-
-        # build query with placeholders
-        placeholders = ["(?, ?, ?, ?)" for t in insert_values]
-        insert_sql = f"""
-            insert or ignore into news(
-                channel_id,
-                title,
-                url,
-                summary
-            )
-            values {','.join(placeholders)}
-        """
-
-        # insert
-        try:
-            self._cursor.execute(insert_sql, [d for sublist in insert_values for d in sublist])
-            # self._connection.commit()
-        except sqlite3.OperationalError:
-            pass
-
-    def get_news(self, channel_title):
-        return self._cursor.execute('''
-            select news.id, news.channel_id, news.title, news.url
+            if not d.get('link'):
+                continue
+
+            # sanityzuj tytuł, wyciągnij tekst z HTML treści
+            title = self._sanitize_title(d.get('title', ''))
+            summary = d.get('summary', '')
+            text = com.bps.news.text.html_to_text(summary)
+            insert_values.append((channel_id, title, d['link'], com.bps.news.text.compress(summary), text))
+
+        news_ids = []
+        for i in range(0, len(insert_values), self.ADD_NEWS_CHUNK):
+            chunk = insert_values[i:i + self.ADD_NEWS_CHUNK]
+
+            # nowe wpisy dostaną id większe od obecnego największego
+            last_id = self._cursor.execute('select coalesce(max(id), 0) from news').fetchone()[0]
+            self._cursor.executemany('''
+                insert or ignore into news(channel_id, title, url, summary, text)
+                select ?, ?, ?, ?, ?
+                where not exists (select 1 from news_purged where url = ?)
+            ''', [(*values, values[2]) for values in chunk])
+            if self._cursor.rowcount <= 0:
+                continue
+
+            inserted = self._cursor.execute('select id, url from news where id > ?', (last_id,)).fetchall()
+
+            # zaindeksuj słowa nowych wpisów
+            texts = {url: f'{channel_title} {title} {text}' for channel_id, title, url, summary, text in chunk}
+            self._index_news([(row['id'], texts[row['url']]) for row in inserted])
+
+            news_ids.extend(row['id'] for row in inserted)
+
+        return news_ids
+
+    def _get_word_ids(self, words):
+        '''Zwraca słownik słowo -> words.id, brakujące słowa są dodawane z wagą 0.'''
+        missing = [word for word in words if word not in self._word_ids]
+        if missing:
+            self._cursor.executemany('insert or ignore into words(word) values (?)', [(word,) for word in missing])
+
+            # pobieraj porcjami aby nie przekroczyć limitu parametrów zapytania
+            for i in range(0, len(missing), 500):
+                chunk = missing[i:i + 500]
+                placeholders = ','.join('?' * len(chunk))
+                for row in self._cursor.execute(f'select id, word from words where word in ({placeholders})', chunk):
+                    self._word_ids[row['word']] = row['id']
+
+        return {word: self._word_ids[word] for word in words}
+
+    def _index_news(self, news_texts):
+        '''Dodaje wpisy indeksu news_word dla listy (news_id, tekst).'''
+        postings = []
+        for news_id, text in news_texts:
+            words_count = self.recommend_count_words(text)
+            word_ids = self._get_word_ids([word for word, count in words_count])
+            postings.extend((news_id, word_ids[word], count) for word, count in words_count)
+
+        self._cursor.executemany('insert or ignore into news_word(news_id, word_id, count) values (?, ?, ?)', postings)
+
+    def get_news(self, channel_title, after=None, limit=100):
+        '''Zwraca porcję nieprzeczytanych newsów kanału od największej jakości.
+
+        after - (quality, id) ostatniego newsa poprzedniej porcji, zapytanie idzie po indeksie
+        news_channel_unread_idx więc kolejne porcje nie wymagają pomijania wcześniejszych wierszy.'''
+        where = ''
+        params = [channel_title]
+        if after is not None:
+            where = 'and (news.quality, news.id) < (?, ?)'
+            params.extend(after)
+
+        return self._read(f'''
+            select news.id, news.channel_id, news.title, news.url, news.quality
             from news
-            left join channel on channel.id = news.channel_id
             where
-                channel.title = ?
-                and is_read = 0 limit 100
-        ''', (channel_title,)).fetchall()
+                news.channel_id = (select id from channel where title = ?)
+                and news.is_read = 0 {where}
+            order by news.quality desc, news.id desc
+            limit ?
+        ''', (*params, limit))
+
+    def search_news(self, text, limit=200):
+        '''Wyszukuje newsy pasujące do wpisanego tekstu, od najlepiej dopasowanych.
+
+        Ostatnie słowo jest traktowane jako prefiks, aby wyniki pojawiały się w trakcie pisania.'''
+        words = re.findall(r'\w+', text)
+        if not words:
+            return []
+
+        # prefiks jednoznakowy dopasowuje prawie cały indeks, szukaj wtedy całego słowa
+        query = ' '.join(f'"{word}"' for word in words)
+        if len(words[-1]) > 1:
+            query += '*'
+
+        # ocena trafności (bm25) wszystkich dopasowań jest kosztowna,
+        # przy bardzo ogólnych zapytaniach pokaż po prostu najnowsze
+        matches = self._read_one('''
+            select count(*) from (select rowid from news_fts where news_fts match ? limit ?)
+        ''', (query, self.SEARCH_RANK_LIMIT + 1))[0]
+        order_by = 'news_fts.rank' if matches <= self.SEARCH_RANK_LIMIT else 'news_fts.rowid desc'
+
+        return self._read(f'''
+            select news.id, news.channel_id, news.title, news.url
+            from news_fts
+            join news on news.id = news_fts.rowid
+            where news_fts match ?
+            order by {order_by}
+            limit ?
+        ''', (query, limit))
 
     def get_news_from_id(self, news_id):
-        return self._cursor.execute('select * from news where id = ?', (news_id,)).fetchone()
+        return self._read_one(f'select {self.NEWS_COLUMNS} from news where id = ?', (news_id,))
 
     def get_news_next(self, channel_name=None, random=False):
         params = []
 
-        sql = '''
-            select news.*, channel.title as channel_title
+        sql = f'''
+            select {self.NEWS_COLUMNS}, channel.title as channel_title
             from news
             inner join channel on channel.id = news.channel_id
             where is_read  = 0'''
@@ -109,7 +720,27 @@ class Database:
         # powinien być tylko jeden
         sql += ' limit 1'
 
-        return self._cursor.execute(sql, params).fetchone()
+        return self._read_one(sql, params)
+
+    def get_news_ranked(self, limit, after=None):
+        '''Zwraca kolejne nieprzeczytane newsy od największej jakości.
+
+        after - (quality, id) ostatniego newsa z poprzedniej porcji, zapytanie idzie po indeksie
+        news_unread_quality_idx zamiast sortować wszystkie nieprzeczytane newsy.'''
+        where = ''
+        params = []
+        if after is not None:
+            where = 'and (news.quality, news.id) < (?, ?)'
+            params.extend(after)
+
+        return self._read(f'''
+            select {self.NEWS_COLUMNS}, channel.title as channel_title
+            from news
+            inner join channel on channel.id = news.channel_id
+            where news.is_read = 0 {where}
+            order by news.quality desc, news.id desc
+            limit ?
+        ''', (*params, limit))
 
     def recommend_count_words(self, text):
         # usuń znaki specjalne
@@ -125,114 +756,256 @@ class Database:
         c = collections.Counter(text)
         return c.most_common()
 
+    @writes
     def recommend_update_words(self, words_count):
         # aktualizuj tabelę words
         for word, count in words_count:
             sql = 'insert into words(word, weight) values(?, ?) on conflict(word) do update set weight = weight + ? where word = ?'
             self._cursor.execute(sql, (word, count, count, word))
 
+    def _recommend_update_where(self, where, params=()):
+        # jakość to suma wag (używanych) słów występujących w newsie
+        self._cursor.execute(f'''
+            update news set quality = coalesce((
+                select sum(words.weight)
+                from news_word
+                join words on words.id = news_word.word_id
+                where news_word.news_id = news.id and words.use = 1
+            ), quality)
+            where {where}
+        ''', params)
+
+    def _get_scorer(self):
+        # wektorowe liczenie quality, jeśli dostępny jest NumPy
+        if self._scorer is None and com.bps.news.scoring.is_available():
+            self._scorer = com.bps.news.scoring.NumpyScorer()
+        return self._scorer
+
+    @writes
     def recommend_update_quality_all(self):
         '''Aktualizuje pole quality dla wszystkich nie przeczytanych newsów'''
-        sql = "select news.id, (channel.title || ' ' || news.title || ' ' || summary) as text from news join channel on channel.id = news.channel_id where is_read = 0"
-        q = self._cursor.execute(sql)
-        for row in q.fetchall():
-            words = [f'"{i}"' for i, c in self.recommend_count_words(row['text'])]
-            words_list = f'({",".join(words)})'
-            new_quality = self._cursor.execute(f'select sum(weight) from words where use = 1 and word in {words_list}').fetchone()[0]
-            if new_quality is not None:
-                self._cursor.execute('update news set quality = ? where id = ?', (new_quality, row['id']))
-
+        # szybka ścieżka NumPy, jeśli niedostępna to liczy SQLite
+        scorer = self._get_scorer()
+        if scorer is not None:
+            scorer.update_quality_all(self._connection)
+        else:
+            self._recommend_update_where('is_read = 0')
+
+    @writes
+    def recommend_update_quality_ids(self, news_ids):
+        '''Aktualizuje pole quality tylko dla wskazanych newsów, np. właśnie dodanych przez add_news'''
+        news_ids = list(news_ids)
+        for i in range(0, len(news_ids), 500):
+            chunk = news_ids[i:i + 500]
+            self._recommend_update_where(f'id in ({",".join("?" * len(chunk))})', chunk)
+
+    @writes
+    def recommend_update_quality_words(self, words):
+        '''Aktualizuje pole quality nie przeczytanych newsów zawierających którekolwiek ze słów'''
+        # macierz słów jest w pamięci, taniej przeliczyć wszystko od razu
+        scorer = self._get_scorer()
+        if scorer is not None:
+            scorer.update_quality_all(self._connection)
+            return
+
+        word_ids = list(self._get_word_ids(words).values())
+
+        # dotknij tylko wpisów indeksu zmienionych słów
+        for i in range(0, len(word_ids), 500):
+            chunk = word_ids[i:i + 500]
+            self._recommend_update_where(f'id in (select news_id from news_word where word_id in ({",".join("?" * len(chunk))}))', chunk)
+
+    @writes
     def recommend_update_quality(self, word):
-        # znajdź wszystkie nie przejrzane zawierajace słowo
-        sql = "select news.id, (channel.title || ' ' || news.title || ' ' || summary) as text from news join channel on channel.id = news.channel_id where is_read = 0 and (channel.title || ' ' || news.title || ' ' || summary) like ? collate nocase"
-        q = self._cursor.execute(sql, (f'%{word}%',))
-        for row in q:
-            words = [f'"{i}"' for i, c in self.recommend_count_words(row['text'])]
-            words_list = f'({",".join(words)})'
-            new_quality = self._cursor.execute(f'select sum(weight) from words where use = 1 and word in {words_list}').fetchone()[0]
-            if new_quality is not None:
-                self._cursor.execute('update news set quality = ? where id = ?', (new_quality, row['id']))
+        self.recommend_update_quality_words([word])
 
+    @writes
     def commit(self):
         self._connection.commit()
 
     def get_news_count(self):
-        return self._cursor.execute('''
-            SELECT channel.title, count(news.id)
-            from news
-            left join channel on channel.id = news.channel_id
-            where
-                is_read = 0
-            group by channel.title
-        ''').fetchall()
+        return self._read('select title, unread_count from channel')
 
+    @writes
     def set_all_as_read(self):
         self._cursor.execute('update news set is_read = 1 where is_read = 0')
         self._connection.commit()
 
+    @writes
     def set_news_as_read(self, note_id):
         self._cursor.execute('update news set is_read = 1 where id = ?', (note_id,))
         self._connection.commit()
 
+    @writes_async
+    def set_news_as_read_async(self, note_id):
+        self.set_news_as_read(note_id)
+
     def close(self):
-        self._connection.commit()
-        self._connection.close()
+        self._close_writer()
+        self._writer.stop()
+        self._writer = None
+        self._reader_connection.close()
 
     @classmethod
     def create_new(cls, filename):
         '''Tworzy nową bazę danych pod wskazaną ścieżką i nazwą pliku.'''
-        sql = [
-            '''
-            create table folder(
-                id integer primary key autoincrement,
-                title varchar(100) not null unique,
-                expanded boolean not null default 0
-            );
-            ''',
-            '''
-            create table channel(
-                id integer primary key autoincrement,
-                title varchar(100) not null,
-                url varchar(512) not null,
-                folder_id integer,
-                foreign key (folder_id) references folder(id)
-            );
-            ''',
-            '''
-            create table news(
-                id integer primary key autoincrement,
-                channel_id int not null,
-                title varchar(256) not null,
-                url varchar(512) not null unique,
-                summary text not null,
-                is_read boolean default 0,
-                foreign key (channel_id) references channel(id)
-            );
-            '''
-        ]
-
         # utwórz ścieżkę katalogów do pliku jeśli nie istnieją
         dir_ = os.path.split(filename)[0]
         if dir_ is not None:
             os.makedirs(dir_, 0o775, True)
 
-        # utwórz plik bazy
+        # utwórz plik bazy, schemat tworzą migracje
         try:
-            with sqlite3.connect(filename) as c:
-                c = c.cursor()
-                for s in sql:
-                    c.execute(s)
+            cls(filename).close()
         except:
             os.remove(filename)
 
+    @writes
+    def add_update_run(self, started_at, duration, engine, channels_stats, keep=UPDATE_RUNS_KEEP):
+        '''Zapisuje pomiary aktualizacji (lista updater.ChannelStats), zwraca id aktualizacji.
+
+        Przechowywane są tylko pomiary ostatnich keep aktualizacji.'''
+        sizes = [stats.bytes for stats in channels_stats if stats.bytes is not None]
+        self._cursor.execute('''
+            insert into update_run(started_at, duration, engine, channels, new_items, not_modified, errors, bytes)
+            values (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            int(started_at), duration, engine, len(channels_stats),
+            sum(stats.new_items for stats in channels_stats),
+            sum(1 for stats in channels_stats if stats.not_modified),
+            sum(1 for stats in channels_stats if stats.error is not None),
+            sum(sizes) if sizes else None
+        ))
+        run_id = self._cursor.lastrowid
+
+        self._cursor.executemany('''
+            insert or replace into channel_metrics(
+                run_id, channel_id, connect_time, download_time, parse_time, fetch_time,
+                add_news_time, scoring_time, commit_time, total_time, bytes, new_items, not_modified, error
+            ) values (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [(
+            run_id, stats.channel_id, stats.connect_time, stats.download_time, stats.parse_time, stats.fetch_time,
+            stats.add_news_time, stats.scoring_time, stats.commit_time, stats.duration,
+            stats.bytes, stats.new_items, stats.not_modified, stats.error
+        ) for stats in channels_stats])
+
+        # usuń pomiary starszych aktualizacji
+        oldest = self._cursor.execute('select id from update_run order by id desc limit 1 offset ?', (keep - 1,)).fetchone()
+        if oldest is not None:
+            self._cursor.execute('delete from channel_metrics where run_id < ?', (oldest['id'],))
+            self._cursor.execute('delete from update_run where id < ?', (oldest['id'],))
+
+        self._connection.commit()
+        return run_id
+
+    def get_update_runs(self, limit=UPDATE_RUNS_KEEP):
+        return self._read('select * from update_run order by id desc limit ?', (limit,))
+
+    def get_update_run(self, run_id=None):
+        '''Zwraca podsumowanie aktualizacji, domyślnie ostatniej.'''
+        if run_id is None:
+            return self._read_one('select * from update_run order by id desc limit 1')
+        return self._read_one('select * from update_run where id = ?', (run_id,))
+
+    def get_channel_metrics(self, run_id, limit=None):
+        '''Pomiary kanałów z jednej aktualizacji, od najwolniejszego.'''
+        return self._read('''
+            select channel_metrics.*, channel.title
+            from channel_metrics
+            left join channel on channel.id = channel_metrics.channel_id
+            where channel_metrics.run_id = ?
+            order by channel_metrics.total_time desc
+            limit ?
+        ''', (run_id, -1 if limit is None else limit))
+
     def get_folders(self):
-        return self._cursor.execute('select title, expanded from folder order by title').fetchall()
+        return self._read('select title, expanded from folder order by title')
+
+    def get_setting(self, key, default=None):
+        row = self._read_one('select value from settings where key = ?', (key,))
+        return default if row is None else row['value']
+
+    @writes
+    def set_setting(self, key, value):
+        self._cursor.execute('insert into settings(key, value) values (?, ?) on conflict(key) do update set value = excluded.value', (key, value))
+        self._connection.commit()
+
+    @writes
+    def purge_read_news(self, days, batch_size=500):
+        '''Usuwa porcję newsów przeczytanych dawniej niż days dni temu, zachowując ich adresy.
+
+        Zwraca ilość usuniętych newsów, mniej niż batch_size oznacza że nic więcej nie zostało.'''
+        ids = [row['id'] for row in self._cursor.execute('''
+            select id from news
+            where is_read = 1 and read_at < cast(strftime('%s', 'now') as integer) - ?
+            limit ?
+        ''', (days * 24 * 60 * 60, batch_size))]
+        if not ids:
+            return 0
+
+        placeholders = ','.join('?' * len(ids))
+        self._cursor.execute(f'insert or ignore into news_purged(url) select url from news where id in ({placeholders})', ids)
+        self._cursor.execute(f'delete from news where id in ({placeholders})', ids)
+        self._connection.commit()
+        return len(ids)
+
+    @writes
+    def prune_words(self, after_id=0, batch_size=5000):
+        '''Usuwa z porcji tabeli words słowa bez wagi, do których nie odwołuje się już indeks news_word.
+
+        Słowa przeczytanych i usuniętych newsów zostają w words z wagą 0, bez usuwania tabela
+        rosła by z każdą aktualizacją. Zwraca id ostatniego sprawdzonego słowa (after_id następnej
+        porcji) lub None gdy sprawdzono całą tabelę.'''
+        rows = self._cursor.execute('select id from words where id > ? order by id limit ?', (after_id, batch_size)).fetchall()
+        if not rows:
+            return None
+
+        last_id = rows[-1]['id']
+        unused = self._cursor.execute('''
+            select id, word from words
+            where
+                id > ? and id <= ? and weight = 0 and use = 1
+                and not exists (select 1 from news_word where news_word.word_id = words.id)
+        ''', (after_id, last_id)).fetchall()
+        if unused:
+            self._cursor.executemany('delete from words where id = ?', [(row['id'],) for row in unused])
+            self._connection.commit()
+            for row in unused:
+                self._word_ids.pop(row['word'], None)
+
+        return last_id
+
+    @writes
+    def incremental_vacuum(self, pages):
+        '''Oddaje systemowi do pages wolnych stron pliku, zwraca ilość wolnych stron które zostały.'''
+        if self._cursor.execute('pragma auto_vacuum').fetchone()[0] != 2:
+            return 0
+
+        self._cursor.execute(f'pragma incremental_vacuum({int(pages)})').fetchall()
+        self._connection.commit()
+        return self._cursor.execute('pragma freelist_count').fetchone()[0]
+
+    @writes
+    def enable_incremental_vacuum(self):
+        '''Przełącza starszy plik na auto_vacuum = incremental, wymaga jednorazowego VACUUM.
+
+        VACUUM przepisuje cały plik i blokuje wątek zapisu do końca, dlatego jest wywoływane tylko
+        na żądanie (news --compact), nigdy automatycznie przy otwartym oknie.'''
+        if self._cursor.execute('pragma auto_vacuum').fetchone()[0] == 2:
+            return False
+
+        self._connection.commit()
+        self._cursor.execute('pragma auto_vacuum = incremental')
+        self._cursor.execute('vacuum')
+        return True
 
+    @writes
     def add_folder(self, title):
         self._cursor.execute('insert into folder(title) values(?)', (title,))
         self._connection.commit()
         return True
 
+    @writes
     def set_folder_expanded(self, folder_title, is_expanded):
         self._cursor.execute('update folder set expanded = ? where title = ?', (is_expanded, folder_title))
         self._connection.commit()
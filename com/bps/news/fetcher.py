@@ -0,0 +1,276 @@
+import ssl
+import time
+import zlib
+import asyncio
+import contextlib
+import collections
+import urllib.parse
+import concurrent.futures
+
+
+USER_AGENT = 'news/0.1 (+https://github.com/jaroslaw-janikowski/news)'
+
+
+def get_host(url):
+    return urllib.parse.urlsplit(url).netloc.lower()
+
+
+class FetchError(Exception):
+    pass
+
+
+class ThreadFetcher:
+    '''Pobiera kanały w puli wątków, każdy kanał pobiera i parsuje się sam (Channel.get_news).'''
+
+    def __init__(self, jobs=8, per_host=2):
+        self._jobs = max(1, jobs)
+        self._per_host = per_host
+
+    def fetch(self, jobs, on_result, is_stopped):
+        '''Pobiera wszystkie kanały z listy jobs = [(klucz, kanał), ...].
+
+        Dla każdego kanału wywołuje on_result(klucz, items, wyjątek) z wątku wywołującego fetch.'''
+        # kolejki kanałów do pobrania pogrupowane według hosta
+        pending = collections.OrderedDict()
+        for key, channel in jobs:
+            pending.setdefault(get_host(channel.get_url()), collections.deque()).append((key, channel))
+
+        in_flight = {}
+        host_load = collections.Counter()
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self._jobs) as executor:
+            def submit_ready():
+                # zleć pobieranie kanałów nie przekraczając limitu wątków i limitu na host
+                for host in list(pending):
+                    queue = pending[host]
+                    while queue and len(in_flight) < self._jobs and (not self._per_host or host_load[host] < self._per_host):
+                        key, channel = queue.popleft()
+                        future = executor.submit(self._get_news, channel)
+                        in_flight[future] = (host, key)
+                        host_load[host] += 1
+
+                    if not queue:
+                        del pending[host]
+
+                    if len(in_flight) >= self._jobs:
+                        break
+
+            submit_ready()
+
+            while in_flight:
+                done, not_done = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    host, key = in_flight.pop(future)
+                    host_load[host] -= 1
+                    try:
+                        on_result(key, future.result(), None)
+                    except Exception as e:
+                        on_result(key, None, e)
+
+                if is_stopped():
+                    # nie zlecaj kolejnych kanałów, poczekaj tylko na te w trakcie pobierania
+                    pending.clear()
+                else:
+                    submit_ready()
+
+    @staticmethod
+    def _get_news(channel):
+        start = time.perf_counter()
+        try:
+            return channel.get_news()
+        finally:
+            channel.fetch_time = time.perf_counter() - start
+
+
+class AsyncFetcher:
+    '''Pobiera kanały w jednej pętli asyncio, parsowanie odbywa się osobno w puli wątków.
+
+    Kanał musi udostępniać get_request() -> (url, nagłówki), set_response(status, nagłówki) oraz parse(dane) -> items.'''
+
+    def __init__(self, concurrency=500, per_host=8, timeout=30, parse_workers=2, max_redirects=5):
+        self._concurrency = max(1, concurrency)
+        self._per_host = per_host
+        self._timeout = timeout
+        self._parse_workers = max(1, parse_workers)
+        self._max_redirects = max_redirects
+        self._ssl_context = ssl.create_default_context()
+
+    def fetch(self, jobs, on_result, is_stopped):
+        '''Interfejs zgodny z ThreadFetcher.fetch.'''
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self._parse_workers) as parse_pool:
+            asyncio.run(self._fetch_all(jobs, on_result, is_stopped, parse_pool))
+
+    async def _fetch_all(self, jobs, on_result, is_stopped, parse_pool):
+        limit = asyncio.Semaphore(self._concurrency)
+        host_limits = {}
+        tasks = []
+        for key, channel in jobs:
+            host = get_host(channel.get_url())
+            if self._per_host and host not in host_limits:
+                host_limits[host] = asyncio.Semaphore(self._per_host)
+            tasks.append(self._fetch_one(key, channel, limit, host_limits.get(host), on_result, is_stopped, parse_pool))
+
+        await asyncio.gather(*tasks)
+
+    async def _fetch_one(self, key, channel, limit, host_limit, on_result, is_stopped, parse_pool):
+        start = None
+        try:
+            # najpierw limit hosta, aby kanały czekające na zajęty host nie zajmowały miejsc limitu ogólnego
+            async with host_limit or contextlib.nullcontext():
+                async with limit:
+                    start = time.perf_counter()
+                    data = await self._download(channel, is_stopped)
+
+            if data is None:
+                return
+            channel.download_time = time.perf_counter() - start - (channel.connect_time or 0.0)
+
+            # kanał nie zmienił się od ostatniego pobrania, nie ma czego parsować
+            if channel.not_modified:
+                items = []
+            else:
+                # parsowanie nie blokuje pętli zdarzeń
+                loop = asyncio.get_running_loop()
+                items = await loop.run_in_executor(parse_pool, self._parse, channel, data)
+        except Exception as e:
+            channel.fetch_time = time.perf_counter() - start if start is not None else 0.0
+            on_result(key, None, e)
+        else:
+            channel.fetch_time = time.perf_counter() - start
+            on_result(key, items, None)
+
+    @staticmethod
+    def _parse(channel, data):
+        # czas samego parsowania, bez czekania na wolny wątek w puli
+        start = time.perf_counter()
+        try:
+            return channel.parse(data)
+        finally:
+            channel.parse_time = time.perf_counter() - start
+
+    async def _download(self, channel, is_stopped):
+        if is_stopped():
+            return None
+
+        url, headers = channel.get_request()
+        response = await asyncio.wait_for(self.request(url, headers), self._timeout)
+        channel.connect_time = response.connect_time
+        channel.bytes = response.size
+        channel.set_response(response.status, response.headers)
+        if response.status not in (200, 304):
+            raise FetchError(f'HTTP {response.status} {url}')
+
+        return response.body
+
+    async def request(self, url, headers=None):
+        '''Wykonuje zapytanie GET podążając za przekierowaniami.
+
+        Response.connect_time i Response.size obejmują wszystkie przekierowania.'''
+        connect_time = 0.0
+        size = 0
+        for i in range(self._max_redirects + 1):
+            response = await self._request_once(url, headers or {})
+            connect_time += response.connect_time
+            size += response.size
+            location = response.headers.get('location')
+            if response.status in (301, 302, 303, 307, 308) and location:
+                url = urllib.parse.urljoin(url, location)
+                continue
+
+            response.connect_time = connect_time
+            response.size = size
+            return response
+
+        raise FetchError(f'Too many redirects: {url}')
+
+    async def _request_once(self, url, headers):
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            raise FetchError(f'Unsupported URL scheme: {url}')
+
+        is_https = parts.scheme == 'https'
+        host = parts.hostname
+        port = parts.port or (443 if is_https else 80)
+        target = urllib.parse.quote(parts.path or '/', safe="/%:@!$&'()*+,;=~")
+        if parts.query:
+            target += '?' + urllib.parse.quote(parts.query, safe="/%:@!$&'()*+,;=~?")
+
+        request_headers = {
+            'Host': parts.netloc.rsplit('@', 1)[-1],
+            'User-Agent': USER_AGENT,
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'close'
+        }
+        request_headers.update(headers)
+        head = f'GET {target} HTTP/1.1\r\n' + ''.join(f'{k}: {v}\r\n' for k, v in request_headers.items()) + '\r\n'
+
+        # DNS, TCP i TLS
+        start = time.perf_counter()
+        reader, writer = await asyncio.open_connection(
+            host, port,
+            ssl=self._ssl_context if is_https else None,
+            server_hostname=host if is_https else None
+        )
+        connect_time = time.perf_counter() - start
+        try:
+            writer.write(head.encode('latin-1'))
+            await writer.drain()
+            response = await self._read_response(url, reader)
+            response.connect_time = connect_time
+            return response
+        finally:
+            writer.close()
+
+    async def _read_response(self, url, reader):
+        status_line = (await reader.readline()).decode('latin-1').split(None, 2)
+        if len(status_line) < 2 or not status_line[0].startswith('HTTP/'):
+            raise FetchError(f'Invalid HTTP response: {url}')
+        status = int(status_line[1])
+
+        response_headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1')
+            if line in ('\r\n', '\n', ''):
+                break
+            name, _, value = line.partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        # odczytaj treść odpowiedzi
+        if status in (204, 304) or 100 <= status < 200:
+            body = b''
+        elif 'chunked' in response_headers.get('transfer-encoding', '').lower():
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';', 1)[0].strip() or b'0', 16)
+                if size == 0:
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            body = b''.join(chunks)
+        elif 'content-length' in response_headers:
+            body = await reader.readexactly(int(response_headers['content-length']))
+        else:
+            body = await reader.read()
+
+        # rozpakuj treść, size to ilość bajtów przesłanych przez sieć
+        size = len(body)
+        encoding = response_headers.get('content-encoding', '').lower()
+        if encoding == 'gzip':
+            body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+        elif encoding == 'deflate':
+            try:
+                body = zlib.decompress(body)
+            except zlib.error:
+                body = zlib.decompress(body, -zlib.MAX_WBITS)
+
+        return Response(url, status, response_headers, body, size)
+
+
+class Response:
+    def __init__(self, url, status, headers, body, size=None, connect_time=0.0):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.size = len(body) if size is None else size
+        self.connect_time = connect_time
@@ -0,0 +1,69 @@
+import time
+import threading
+
+
+class RetentionJob(threading.Thread):
+    '''Usuwa w tle stare przeczytane newsy i nieużywane słowa, zmniejsza plik bazy.
+
+    Plik zmniejsza się tylko przy auto_vacuum = incremental (nowe pliki). W starszych plikach zwolnione
+    strony są używane ponownie, przełączenie wymaga VACUUM całego pliku (news --compact).
+    Każda porcja to osobne zadanie dla wątku zapisującego bazy, więc inne zapisy
+    (np. oznaczanie jako przeczytane) nie czekają na koniec całego czyszczenia.'''
+
+    # ustawienie w tabeli settings, 0 - przechowuj przeczytane newsy bez końca;
+    # domyślnie nic nie jest usuwane, dopóki użytkownik sam nie ustawi okresu (News > Retention)
+    RETENTION_DAYS_KEY = 'retention_days'
+    DEFAULT_RETENTION_DAYS = 0
+
+    def __init__(self, database, days=None, batch_size=500, vacuum_pages=1000, pause=0.2, on_end=None):
+        super().__init__(name='RetentionJob', daemon=True)
+        self._db = database
+        self._days = days
+        self._batch_size = batch_size
+        self._vacuum_pages = vacuum_pages
+        self._pause = pause
+        self._on_end = on_end
+        self._do_stop = False
+        self.purged_count = 0
+
+    @classmethod
+    def get_retention_days(cls, database):
+        return int(database.get_setting(cls.RETENTION_DAYS_KEY, cls.DEFAULT_RETENTION_DAYS))
+
+    def run(self):
+        days = self._days if self._days is not None else self.get_retention_days(self._db)
+        if days > 0:
+            self._purge(days)
+
+        # słowa przeczytanych newsów zostają w words także bez usuwania newsów
+        self._prune_words()
+
+        if callable(self._on_end):
+            self._on_end(self.purged_count)
+
+    def _purge(self, days):
+        # usuwaj porcjami aż nic nie zostanie
+        while not self._do_stop:
+            n = self._db.purge_read_news(days, self._batch_size)
+            self.purged_count += n
+            if n < self._batch_size:
+                break
+            time.sleep(self._pause)
+
+        if self.purged_count == 0:
+            return
+
+        # oddaj wolne miejsce porcjami, bez auto_vacuum = incremental nic nie robi
+        while not self._do_stop and self._db.incremental_vacuum(self._vacuum_pages) > 0:
+            time.sleep(self._pause)
+
+    def _prune_words(self):
+        after_id = 0
+        while not self._do_stop:
+            after_id = self._db.prune_words(after_id)
+            if after_id is None:
+                break
+            time.sleep(self._pause)
+
+    def cancel(self):
+        self._do_stop = True
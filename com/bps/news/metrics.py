@@ -0,0 +1,124 @@
+import os
+import json
+import time
+
+
+# kolumna channel_metrics -> nazwa etapu aktualizacji kanału
+PHASES = (
+    ('connect_time', 'connect'),
+    ('download_time', 'download'),
+    ('parse_time', 'parse'),
+    ('fetch_time', 'fetch'),
+    ('add_news_time', 'add_news'),
+    ('scoring_time', 'scoring'),
+    ('commit_time', 'commit'),
+    ('total_time', 'total')
+)
+
+
+def get_report(database, run_id=None, slowest=None):
+    '''Zwraca pomiary aktualizacji (domyślnie ostatniej) jako słownik lub None jeśli ich nie ma.
+
+    slowest - ilość najwolniejszych kanałów, domyślnie wszystkie.'''
+    run = database.get_update_run(run_id)
+    if run is None:
+        return None
+
+    channels = [dict(row) for row in database.get_channel_metrics(run['id'])]
+
+    # suma czasów etapów ze wszystkich kanałów, None gdy fetcher etapu nie mierzył
+    phases = {}
+    for column, phase in PHASES:
+        values = [row[column] for row in channels if row[column] is not None]
+        phases[phase] = sum(values) if values else None
+
+    return {'run': dict(run), 'phases': phases, 'channels': channels[:slowest]}
+
+
+def format_report(report, slowest=10):
+    '''Podsumowanie aktualizacji i najwolniejsze kanały jako linie tekstu.'''
+    run = report['run']
+    lines = [
+        f'Update {time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(run["started_at"]))} ({run["engine"]}): '
+        f'{run["duration"]:.1f} s, channels: {run["channels"]}, new news: {run["new_items"]}, '
+        f'not modified: {run["not_modified"]}, errors: {run["errors"]}'
+        + (f', {run["bytes"] / 1024:.0f} KiB' if run['bytes'] is not None else '')
+    ]
+    lines.append('Channel time total: ' + ', '.join(
+        f'{phase} {seconds:.1f} s' for phase, seconds in report['phases'].items() if seconds is not None
+    ))
+
+    if slowest and report['channels']:
+        lines.append('Slowest channels:')
+        for row in report['channels'][:slowest]:
+            phases = ', '.join(
+                f'{phase} {row[column]:.2f}' for column, phase in PHASES[:-1] if row[column] is not None
+            )
+            status = f' error: {row["error"]}' if row['error'] else (' not modified' if row['not_modified'] else f' new: {row["new_items"]}')
+            size = f', {row["bytes"] / 1024:.0f} KiB' if row['bytes'] is not None else ''
+            lines.append(f'  {row["total_time"]:7.2f} s {row["title"]} ({phases}{size};{status})')
+
+    return lines
+
+
+def export_json(report, filename):
+    with open(filename, 'w') as f:
+        json.dump(report, f, indent=2)
+
+
+def _label(value):
+    value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return f'"{value}"'
+
+
+def export_prometheus(report, filename):
+    '''Zapisuje pomiary w formacie tekstowym Prometheus (np. dla textfile collector node_exporter).
+
+    Plik jest podmieniany w całości, aby collector nie odczytał go w połowie zapisu.'''
+    run = report['run']
+    lines = [
+        '# HELP news_update_timestamp_seconds Start time of the last feed update.',
+        '# TYPE news_update_timestamp_seconds gauge',
+        f'news_update_timestamp_seconds {run["started_at"]}',
+        '# HELP news_update_duration_seconds Wall time of the last feed update.',
+        '# TYPE news_update_duration_seconds gauge',
+        f'news_update_duration_seconds {run["duration"]}'
+    ]
+    for name, help_text in (
+        ('channels', 'Channels updated'),
+        ('new_items', 'New news added'),
+        ('not_modified', 'Channels answering 304 Not Modified'),
+        ('errors', 'Channels that failed'),
+        ('bytes', 'Bytes downloaded')
+    ):
+        if run[name] is not None:
+            lines += [
+                f'# HELP news_update_{name} {help_text} in the last feed update.',
+                f'# TYPE news_update_{name} gauge',
+                f'news_update_{name} {run[name]}'
+            ]
+
+    lines += [
+        '# HELP news_update_phase_seconds Time spent in each phase, summed over channels.',
+        '# TYPE news_update_phase_seconds gauge'
+    ]
+    lines += [f'news_update_phase_seconds{{phase="{phase}"}} {seconds}' for phase, seconds in report['phases'].items() if seconds is not None]
+
+    lines += [
+        '# HELP news_channel_phase_seconds Time spent in each phase of a channel update.',
+        '# TYPE news_channel_phase_seconds gauge'
+    ]
+    for row in report['channels']:
+        channel = _label(row['title'])
+        lines += [f'news_channel_phase_seconds{{channel={channel},phase="{phase}"}} {row[column]}' for column, phase in PHASES if row[column] is not None]
+
+    lines += [
+        '# HELP news_channel_new_items New news added to a channel.',
+        '# TYPE news_channel_new_items gauge'
+    ]
+    lines += [f'news_channel_new_items{{channel={_label(row["title"])}}} {row["new_items"]}' for row in report['channels']]
+
+    temp_filename = f'{filename}.{os.getpid()}.tmp'
+    with open(temp_filename, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(temp_filename, filename)
@@ -0,0 +1,105 @@
+import threading
+import collections
+
+
+class NewsQueue:
+    '''Kolejka następnych newsów do akcji "Next", od największej jakości.
+
+    Trzyma w pamięci size newsów (z gotowym tekstem), a gdy zostanie ich refill_at lub mniej
+    doczytuje kolejne w tle, więc przejście do następnego newsa nie czeka na bazę.
+    Po zmianie ocen lub aktualizacji kanałów kolejkę trzeba unieważnić (invalidate).'''
+
+    def __init__(self, database, size=20, refill_at=5):
+        self._db = database
+        self._size = size
+        self._refill_at = refill_at
+
+        self._lock = threading.Lock()
+        # tylko jedno doczytywanie naraz, kolejne porcje zaczynają się za poprzednią
+        self._fill_lock = threading.Lock()
+
+        self._items = collections.deque()
+        self._after = None
+        self._exhausted = False
+        self._refilling = False
+        self._generation = 0
+        self._pop_generation = None
+
+        # id -> Future oznaczania jako przeczytany, dopóki zapis się nie wykona
+        # news może jeszcze wrócić z bazy jako nieprzeczytany
+        self._consumed = {}
+
+    def _fill(self, generation):
+        with self._fill_lock:
+            with self._lock:
+                if generation != self._generation or self._exhausted:
+                    return
+
+                after = self._after
+                self._consumed = {news_id: future for news_id, future in self._consumed.items() if not future.done()}
+                consumed = set(self._consumed)
+
+            rows = self._db.get_news_ranked(self._size, after)
+
+            with self._lock:
+                if generation != self._generation:
+                    return
+
+                self._refilling = False
+
+                if rows:
+                    self._after = (rows[-1]['quality'], rows[-1]['id'])
+                self._exhausted = len(rows) < self._size
+                self._items.extend(row for row in rows if row['id'] not in consumed)
+
+    def _refill(self):
+        '''Doczytuje kolejne newsy w tle jeśli jest ich mało, wywoływana z self._lock.'''
+        if self._refilling or self._exhausted or len(self._items) > self._refill_at:
+            return
+
+        self._refilling = True
+        threading.Thread(target=self._fill, args=(self._generation,), name='NewsQueue', daemon=True).start()
+
+    def pop(self):
+        '''Zwraca następny news, None gdy nie ma już nieprzeczytanych.
+
+        News trzeba oznaczyć jako przeczytany przez mark_as_read po wyświetleniu go na liście kanału,
+        inaczej lista wczytana z bazy mogłaby go już nie zawierać. News którego nie udało się
+        wyświetlić trzeba oddać przez push_back.'''
+        while True:
+            with self._lock:
+                if self._items or self._exhausted:
+                    break
+                generation = self._generation
+
+            # pusta kolejka (pierwsze użycie lub po unieważnieniu) - doczytaj od razu
+            self._fill(generation)
+
+        with self._lock:
+            news = self._items.popleft() if self._items else None
+            self._pop_generation = self._generation
+            self._refill()
+
+        return news
+
+    def push_back(self, news):
+        '''Zwraca news z pop() na początek kolejki, gdy nie dało się go wyświetlić.
+
+        Po unieważnieniu kolejki news nie jest zwracany, nowa porcja z bazy i tak go zawiera.'''
+        with self._lock:
+            if self._pop_generation == self._generation:
+                self._items.appendleft(news)
+
+    def mark_as_read(self, news_id):
+        '''Oznacza news z pop() jako przeczytany bez czekania na zapis.'''
+        future = self._db.set_news_as_read_async(news_id)
+        with self._lock:
+            self._consumed[news_id] = future
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._items.clear()
+            self._after = None
+            self._exhausted = False
+            self._refilling = False
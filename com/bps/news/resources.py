@@ -1,17 +1,30 @@
 from pathlib import Path
-from gi.repository import Gtk
 from gi.repository import GdkPixbuf
 
 
+class IconCache(dict):
+    '''Ikony wczytywane przy pierwszym użyciu i zapamiętywane.'''
+
+    def __init__(self, load_icon):
+        super().__init__()
+        self._load_icon = load_icon
+
+    def __missing__(self, icon_name):
+        icon = self._load_icon(f'{icon_name}.png')
+        self[icon_name] = icon
+        return icon
+
+
 class ResourceManager:
+    # katalog z make install lub res/icons w katalogu ze źródłami
+    ICON_DIRS = (
+        Path('/usr/share/icons/news'),
+        Path(__file__).resolve().parents[3] / 'res' / 'icons'
+    )
+
     def __init__(self):
-        self._icons_dir = Path('/usr/share/icons/news')
-        self.icons = {
-            'rss': self.load_icon('rss.png'),
-            'youtube': self.load_icon('youtube.png'),
-            'twitch': self.load_icon('twitch.png'),
-            'folder': self.load_icon('folder.png')
-        }
+        self._icons_dir = next((path for path in self.ICON_DIRS if path.is_dir()), self.ICON_DIRS[0])
+        self.icons = IconCache(self.load_icon)
 
     def load_icon(self, icon_name):
         return GdkPixbuf.Pixbuf.new_from_file(str(self._icons_dir / icon_name))
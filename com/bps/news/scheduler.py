@@ -0,0 +1,61 @@
+import time
+
+
+class Scheduler:
+    '''Wylicza termin następnej aktualizacji kanału na podstawie historii nowych wpisów.
+
+    Kanały publikujące często są sprawdzane często, a te w których nic się nie pojawia
+    są sprawdzane coraz rzadziej (wykładniczo, aż do max_interval).'''
+
+    MIN_INTERVAL = 15 * 60
+    DEFAULT_INTERVAL = 60 * 60
+    MAX_INTERVAL = 7 * 24 * 60 * 60
+    BACKOFF = 2
+    HISTORY_SIZE = 20
+
+    def __init__(self, database, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL, backoff=BACKOFF):
+        self._db = database
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._backoff = backoff
+
+    def _clamp(self, interval):
+        return int(min(self._max_interval, max(self._min_interval, interval)))
+
+    def next_interval(self, history, interval, now):
+        '''Zwraca nowy odstęp między aktualizacjami.
+
+        history - lista (updated_at, new_items) od najnowszych, zawierająca już bieżącą aktualizację.'''
+        interval = interval or self.DEFAULT_INTERVAL
+
+        # brak nowych wpisów - sprawdzaj rzadziej
+        if not history or history[0][1] == 0:
+            return self._clamp(interval * self._backoff)
+
+        # średni czas pomiędzy nowymi wpisami w oknie historii
+        total_items = sum(new_items for updated_at, new_items in history)
+        oldest = history[-1][0]
+        if len(history) > 1 and now > oldest:
+            return self._clamp((now - oldest) / total_items)
+
+        return self._clamp(interval / self._backoff)
+
+    def channel_updated(self, channel_id, interval, new_items, now=None):
+        '''Zapisuje wynik aktualizacji kanału i ustala termin następnej.'''
+        now = int(now or time.time())
+
+        # historia z bazy (zatwierdzona) uzupełniona o bieżącą aktualizację
+        history = [(now, new_items)]
+        history.extend((h['updated_at'], h['new_items']) for h in self._db.get_channel_history(channel_id, self.HISTORY_SIZE - 1))
+        self._db.add_channel_history(channel_id, now, new_items, self.HISTORY_SIZE)
+
+        interval = self.next_interval(history, interval, now)
+        self._db.set_channel_schedule(channel_id, interval, now + interval)
+        return interval
+
+    def channel_failed(self, channel_id, interval, now=None):
+        '''Błąd pobierania - spróbuj ponownie później, nie zapisując historii.'''
+        now = int(now or time.time())
+        interval = self._clamp((interval or self.DEFAULT_INTERVAL) * self._backoff)
+        self._db.set_channel_schedule(channel_id, interval, now + interval)
+        return interval
@@ -0,0 +1,92 @@
+import itertools
+
+# NumPy jest importowany przy pierwszym is_available(), import trwa około 0.1 s
+numpy = None
+
+
+def is_available():
+    global numpy
+    if numpy is None:
+        try:
+            import numpy as module
+        except ImportError:
+            module = False
+        numpy = module
+    return numpy is not False
+
+
+def _fetch_array(connection, sql, params=(), columns=2):
+    '''Wczytuje wynik zapytania z kolumnami liczbowymi do tablicy (n, columns) bez tworzenia obiektów Row.'''
+    cursor = connection.cursor()
+    cursor.row_factory = None
+    data = numpy.fromiter(itertools.chain.from_iterable(cursor.execute(sql, params)), dtype=numpy.int64)
+    return data.reshape(-1, columns)
+
+
+class NumpyScorer:
+    '''Liczy quality wszystkich nieprzeczytanych newsów jednym mnożeniem macierz * wektor.
+
+    Macierz rzadka newsy x słowa (CSR) jest wczytywana z indeksu news_word i trzymana w pamięci,
+    kolejne wywołania doczytują tylko wpisy nowych newsów (id rosną, wpisy indeksu się nie zmieniają).
+    Wektor to niezerowe wagi używanych słów z tabeli words, czytany za każdym razem.'''
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self._news_ids = numpy.zeros(0, dtype=numpy.int64)
+        self._indptr = numpy.zeros(1, dtype=numpy.int64)
+        self._word_ids = numpy.zeros(0, dtype=numpy.int32)
+        self._last_news_id = 0
+
+    def _load_postings(self, connection):
+        postings = _fetch_array(connection, 'select news_id, word_id from news_word where news_id > ? order by news_id', (self._last_news_id,))
+        if len(postings) == 0:
+            return
+
+        news_ids, counts = numpy.unique(postings[:, 0], return_counts=True)
+        self._news_ids = numpy.concatenate((self._news_ids, news_ids))
+        self._indptr = numpy.concatenate((self._indptr, self._indptr[-1] + numpy.cumsum(counts)))
+        self._word_ids = numpy.concatenate((self._word_ids, postings[:, 1].astype(numpy.int32)))
+        self._last_news_id = int(news_ids[-1])
+
+    def _compact(self, keep):
+        '''Usuwa z macierzy wiersze newsów które zostały przeczytane lub usunięte.'''
+        lengths = numpy.diff(self._indptr)[keep]
+        self._word_ids = self._word_ids[numpy.repeat(keep, numpy.diff(self._indptr))]
+        self._news_ids = self._news_ids[keep]
+        self._indptr = numpy.concatenate(([0], numpy.cumsum(lengths)))
+
+    def update_quality_all(self, connection):
+        '''Przelicza i zapisuje quality, zwraca ilość zmienionych newsów.'''
+        self._load_postings(connection)
+
+        # aktualny stan nieprzeczytanych newsów
+        current = _fetch_array(connection, 'select id, quality from news where is_read = 0 and id <= ? order by id', (self._last_news_id,))
+        keep = numpy.isin(self._news_ids, current[:, 0], assume_unique=True)
+        if not keep.all():
+            self._compact(keep)
+        if len(self._news_ids) == 0:
+            return 0
+
+        # niezerowe wagi posortowane po words.id; words.id tylko rosną (autoincrement, usuwanie
+        # nieużywanych słów), więc wektor indeksowany words.id rósłby bez końca
+        weights = _fetch_array(connection, 'select id, weight from words where use = 1 and weight != 0 order by id')
+        if len(weights):
+            positions = numpy.minimum(numpy.searchsorted(weights[:, 0], self._word_ids), len(weights) - 1)
+            word_weights = numpy.where(weights[positions, 0] == self._word_ids, weights[positions, 1], 0)
+        else:
+            word_weights = numpy.zeros(len(self._word_ids), dtype=numpy.int64)
+
+        # iloczyn macierz CSR * wektor przez sumy prefiksowe wag wszystkich wpisów
+        sums = numpy.concatenate(([0], numpy.cumsum(word_weights)))
+        quality = sums[self._indptr[1:]] - sums[self._indptr[:-1]]
+
+        # zapisz tylko zmienione wartości
+        old_quality = current[numpy.searchsorted(current[:, 0], self._news_ids), 1]
+        changed = quality != old_quality
+        connection.executemany(
+            'update news set quality = ? where id = ?',
+            zip(quality[changed].tolist(), self._news_ids[changed].tolist())
+        )
+        return int(changed.sum())
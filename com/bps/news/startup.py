@@ -0,0 +1,38 @@
+import os
+import sys
+import time
+
+
+class StartupTimer:
+    '''Mierzy czas kolejnych etapów uruchamiania programu.
+
+    Raport jest wypisywany na stderr tylko gdy ustawiona jest zmienna środowiskowa NEWS_STARTUP_TIMING=1.'''
+
+    ENV_VAR = 'NEWS_STARTUP_TIMING'
+
+    def __init__(self, enabled=None):
+        self.enabled = os.environ.get(self.ENV_VAR) == '1' if enabled is None else enabled
+        self._start = time.perf_counter()
+        self._last = self._start
+        self._phases = []
+        self._reported = False
+
+    def mark(self, phase):
+        '''Kończy etap phase, jego czas liczy się od poprzedniego wywołania.'''
+        now = time.perf_counter()
+        self._phases.append((phase, now - self._last, now - self._start))
+        self._last = now
+
+    def report(self, file=None):
+        if not self.enabled or self._reported:
+            return
+        self._reported = True
+
+        file = file or sys.stderr
+        print('Startup timing:', file=file)
+        for phase, duration, elapsed in self._phases:
+            print(f'  {phase:<24} {duration * 1000:8.1f} ms {elapsed * 1000:8.1f} ms', file=file)
+
+
+# pomiar zaczyna się przy pierwszym imporcie tego modułu (com.bps.news.cli)
+timer = StartupTimer()
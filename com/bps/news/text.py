@@ -0,0 +1,117 @@
+import re
+import zlib
+import html
+
+
+# znaczniki zaczynające nową linię
+BLOCK_TAGS = (
+    'br', 'p', 'div', 'li', 'ul', 'ol', 'tr', 'table', 'blockquote', 'pre', 'hr',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'section', 'article', 'header', 'footer', 'figure', 'figcaption'
+)
+
+# znaczniki których treść jest pomijana
+SKIP_TAGS = ('script', 'style', 'noscript', 'template')
+
+# znaczniki bez wpływu na tekst
+INLINE_TAGS = (
+    'a', 'b', 'i', 'u', 's', 'em', 'strong', 'span', 'small', 'big', 'sub', 'sup', 'code', 'font',
+    'img', 'abbr', 'cite', 'q', 'mark', 'del', 'ins', 'strike', 'tt', 'kbd', 'var', 'time', 'wbr',
+    'td', 'th', 'thead', 'tbody', 'tfoot', 'dl', 'dt', 'dd', 'center', 'picture', 'source', 'video', 'audio',
+    'iframe', 'embed', 'object', 'param', 'label', 'html', 'head', 'body', 'meta', 'link', 'title'
+)
+
+# atrybuty znacznika, również z ">" w cudzysłowach; powtarzany jest pojedynczy znak (bez "+" w "*"),
+# a nazwa znacznika kończy się przed atrybutami, więc niezamknięty znacznik ("a<b" w tekście,
+# ucięty HTML) jest odrzucany w czasie liniowym zamiast wykładniczego
+_ATTRS = r'''(?:[^<>"']|"[^"]*"|'[^']*')*'''
+
+# komentarz lub deklaracja (grupa pusta) albo znacznik (grupa to nazwa, z "/" dla zamykającego)
+_TOKEN_RE = re.compile(rf'<!--.*?(?:-->|$)|<[!?][^>]*>?|<(/?[a-zA-Z][^\s/<>]*)(?=[\s/>]){_ATTRS}>', re.S)
+_SKIP_RE = re.compile(rf'<({"|".join(SKIP_TAGS)})(?=[\s/>]){_ATTRS}>.*?(?:</\1\s*>|$)', re.S | re.I)
+_EMPTY_LINES_RE = re.compile(r'\n{3,}')
+
+
+class NewsParser:
+    '''Wyciąga tekst z HTML treści newsa, znaczniki blokowe zamienia na nowe linie.
+
+    Treść jest dzielona na tekst i znaczniki jednym przebiegiem wyrażenia regularnego, znaczniki
+    są podmieniane na "\n" lub "" i całość jest sklejana raz, więc czas jest liniowy względem długości
+    treści. Interfejs jak html.parser.HTMLParser (feed, close).'''
+
+    # nazwa znacznika (otwierającego lub zamykającego) -> zastępujący go tekst
+    _replacements = {tag: '\n' for tag in BLOCK_TAGS}
+    _replacements.update({'/' + tag: '\n' for tag in BLOCK_TAGS if tag != 'br'})
+
+    _known_tags = set(BLOCK_TAGS + SKIP_TAGS + INLINE_TAGS)
+    _known_tags.update(['/' + tag for tag in _known_tags])
+
+    # znaczniki które można po prostu podmienić, bez SKIP_TAGS (ich treść trzeba wyciąć)
+    _simple_tags = _known_tags - set(SKIP_TAGS) - {'/' + tag for tag in SKIP_TAGS}
+
+    # nieobsługiwane znaczniki już zgłoszone, każdy jest wypisywany tylko raz
+    _reported_tags = set()
+
+    def __init__(self):
+        self._fragments = []
+        self._text = None
+
+    def _report_tags(self, tags):
+        unknown = {tag.lower().lstrip('/') for tag in tags if tag.lower() not in self._known_tags} - self._reported_tags
+        for tag in sorted(unknown):
+            print(f'Unprocessed tag: {tag}')
+        self._reported_tags.update(unknown)
+
+    def _parse(self, content):
+        # na nieparzystych pozycjach nazwy znaczników, na parzystych tekst pomiędzy nimi
+        parts = _TOKEN_RE.split(content)
+        tags = set(parts[1::2])
+        tags.discard(None)
+        if not tags <= self._simple_tags:
+            self._report_tags(tags)
+
+            # rzadszy przypadek, treść do pominięcia lub nazwy wielkimi literami
+            if any(tag.lstrip('/').lower() in SKIP_TAGS for tag in tags):
+                parts = _TOKEN_RE.split(_SKIP_RE.sub('', content))
+            parts[1::2] = [self._replacements.get(tag.lower(), '') if tag else '' for tag in parts[1::2]]
+        else:
+            parts[1::2] = [self._replacements.get(tag, '') if tag else '' for tag in parts[1::2]]
+
+        text = ''.join(parts)
+        if '&' in text:
+            text = html.unescape(text)
+
+        # usuń białe znaki na końcach linii i wielokrotne puste linie
+        text = '\n'.join(map(str.rstrip, text.split('\n')))
+        return _EMPTY_LINES_RE.sub('\n\n', text).strip()
+
+    def feed(self, data):
+        self._fragments.append(data)
+        self._text = None
+
+    def close(self):
+        if self._text is None:
+            self._text = self._parse(''.join(self._fragments))
+
+    def get_text(self):
+        self.close()
+        return self._text
+
+
+def html_to_text(content):
+    '''Zamienia HTML treści newsa na tekst do wyświetlenia, oceny i wyszukiwania.'''
+    parser = NewsParser()
+    parser.feed(content)
+    parser.close()
+    return parser.get_text()
+
+
+def compress(content):
+    '''Oryginalny HTML jest przechowywany w bazie spakowany.'''
+    return zlib.compress(content.encode('utf-8'), 6)
+
+
+def decompress(data):
+    # wpisy sprzed pakowania są zwykłym tekstem
+    if isinstance(data, str):
+        return data
+    return zlib.decompress(data).decode('utf-8')
@@ -1,14 +1,17 @@
 import re
 import random
-import html.parser
 from gi.repository import Gtk
 from gi.repository import Gdk
 from gi.repository import GdkPixbuf
-from com.bps.news.updater import Channel
 from com.bps.news.resources import resource
+import com.bps.news.metrics
 
 
 class NewsListView(Gtk.ScrolledWindow):
+    '''Lista newsów wczytywana porcjami w trakcie przewijania.'''
+
+    PAGE_SIZE = 100
+
     def __init__(self, on_activate=None):
         super().__init__()
         self.set_size_request(300, 100)
@@ -26,24 +29,76 @@ class NewsListView(Gtk.ScrolledWindow):
         title_column.add_attribute(title_renderer, 'text', 0)
         self._tree_view.append_column(title_column)
 
+        # id newsa -> wiersz listy (iteratory Gtk.ListStore są trwałe)
+        self._iters = {}
+
+        # doczytywanie kolejnych porcji, loader(ostatni wiersz poprzedniej porcji, limit) -> wiersze
+        self._loader = None
+        self._last_row = None
+        self._has_more = False
+        self._loading = False
+        self.get_vadjustment().connect('value-changed', self._on_scroll)
+
         self.show_all()
 
     def add_news(self, title, id):
-        self._list_store.append((title, id))
+        if id not in self._iters:
+            self._iters[id] = self._list_store.append((title, id))
+
+    def add_news_list(self, rows):
+        '''Dodaje wiersze (z kolumnami title i id) do listy.'''
+        # pierwszą porcję dodaj z modelem odłączonym od widoku, bez przerysowania po każdym wierszu
+        detach = len(self._list_store) == 0
+        if detach:
+            self._tree_view.set_model(None)
+
+        for row in rows:
+            self.add_news(row['title'], row['id'])
+
+        if detach:
+            self._tree_view.set_model(self._list_store)
 
     def clear_news(self):
+        self._loader = None
+        self._last_row = None
+        self._has_more = False
+        self._iters = {}
         self._list_store.clear()
 
+    def load_news(self, loader):
+        '''Wyświetla newsy wczytywane porcjami przez loader(ostatni wiersz lub None, limit).'''
+        self.clear_news()
+        self._loader = loader
+        self._has_more = True
+        self._load_page()
+
+    def _load_page(self):
+        # odłączenie modelu przewija widok, nie doczytuj wtedy następnej porcji
+        self._loading = True
+        try:
+            rows = self._loader(self._last_row, self.PAGE_SIZE)
+            self._has_more = len(rows) >= self.PAGE_SIZE
+            if rows:
+                self._last_row = rows[-1]
+                self.add_news_list(rows)
+        finally:
+            self._loading = False
+
+    def _on_scroll(self, adjustment):
+        # doczytaj kolejną porcję gdy do końca listy zostało mniej niż jeden ekran
+        if self._has_more and not self._loading and adjustment.get_value() + 2 * adjustment.get_page_size() >= adjustment.get_upper():
+            self._load_page()
+
     def select_news(self, news_id):
-        for news in self._list_store:
-            if news[1] == news_id:
-                # zaznacz element
-                self._tree_view.get_selection().select_iter(news.iter)
+        iter_ = self._iters.get(news_id)
+        if iter_ is None:
+            return
 
-                # przewiń widok aby pokazać zaznaczenie
-                self._tree_view.scroll_to_cell(news.path, None, True, 0.5, 0.5)
+        # zaznacz element
+        self._tree_view.get_selection().select_iter(iter_)
 
-                break
+        # przewiń widok aby pokazać zaznaczenie
+        self._tree_view.scroll_to_cell(self._list_store.get_path(iter_), None, True, 0.5, 0.5)
 
     def mark_as_read(self, news):
         pass
@@ -58,30 +113,6 @@ class NewsListView(Gtk.ScrolledWindow):
             self._on_activate(model.get_value(iter_, 1))
 
 
-class NewsParser(html.parser.HTMLParser):
-    def __init__(self):
-        super().__init__()
-        self._text = ''
-
-        self._processed_tags = []  # debug
-
-    def handle_endtag(self, tag):
-        if tag not in self._processed_tags:
-            print(f'Unprocessed tag: {tag}')
-
-    def handle_starttag(self, tag, attrs):
-        if tag == 'br':
-            self._text += '\n'
-
-        self._processed_tags = ['br']  # debug
-
-    def handle_data(self, data):
-        self._text += data
-
-    def get_text(self):
-        return self._text.strip()
-
-
 class NewsViewer(Gtk.Box):
     def __init__(self, on_click=None, on_like=None):
         super().__init__(orientation=Gtk.Orientation.VERTICAL)
@@ -144,10 +175,8 @@ class NewsViewer(Gtk.Box):
         self._url = url
         self.set_news_quality(quality)
 
-        # parsuj HTML
-        parser = NewsParser()
-        parser.feed(content)
-        self._text_buffer.set_text(parser.get_text())
+        # tekst jest wyciągany z HTML przy dodawaniu newsa do bazy
+        self._text_buffer.set_text(content)
 
     def get_url(self):
         return self._url
@@ -184,6 +213,9 @@ class ChannelDialog(Gtk.Dialog):
         self.vbox.pack_start(url_label, False, False, 0)
         self.vbox.pack_start(self._rss_url_entry, False, False, 0)
 
+        # moduł aktualizacji (feedparser, asyncio) nie jest potrzebny przy starcie programu
+        from com.bps.news.updater import Channel
+
         channel_type_label = Gtk.Label('Channel type')
         self._channel_type_combo = Gtk.ComboBoxText()
         for channel_id, channel_class in Channel.Map.items():
@@ -258,6 +290,10 @@ class ChannelViewer(Gtk.ScrolledWindow):
 
         self._tree_store = Gtk.TreeStore(str, int, int, GdkPixbuf.Pixbuf)  # title, unread_count, type(0 - folder, 1 - channel)
 
+        # tytuł -> Gtk.TreeRowReference, referencje same śledzą zmiany pozycji w drzewie
+        self._channel_rows = {}
+        self._folder_rows = {}
+
         # icon column
         icon_renderer = Gtk.CellRendererPixbuf()
         icon_column = Gtk.TreeViewColumn(None, icon_renderer)
@@ -375,6 +411,7 @@ class ChannelViewer(Gtk.ScrolledWindow):
         # przenieś element poprzez zrobienie kopii i usunięcie starego
         self._tree_store.remove(source_iter)
         new_channel_iter = self._tree_store.append(dest_iter, (channel_title, unread_count, self.ITEM_TYPE_CHANNEL, icon))
+        self._channel_rows[channel_title] = self._row_reference(new_channel_iter)
 
         # odśwież ilość nieprzeczytanych w folderze do którego wrzuciłeś ciągnięty kanał
         if dest_iter is not None:
@@ -389,12 +426,24 @@ class ChannelViewer(Gtk.ScrolledWindow):
         if callable(self._on_dragdrop_channel):
             self._on_dragdrop_channel(channel_title, folder_title)
 
+    def _row_reference(self, iter_):
+        return Gtk.TreeRowReference.new(self._tree_store, self._tree_store.get_path(iter_))
+
+    def _get_row_iter(self, rows, title):
+        row = rows.get(title)
+        if row is None or not row.valid():
+            return None
+        return self._tree_store.get_iter(row.get_path())
+
+    def _get_channel_iter(self, channel_title):
+        return self._get_row_iter(self._channel_rows, channel_title)
+
     def add_folder(self, channel_title, expanded=False):
         iter_ = self._tree_store.append(None, (channel_title, 0, self.ITEM_TYPE_FOLDER, resource.icons['folder']))
+        self._folder_rows[channel_title] = self._row_reference(iter_)
 
     def toggle_folder(self, folder_title, expand):
         '''Zwiń / rozwiń katalog bez emitowania zdarzeń.'''
-        iter_ = self._tree_store.get_iter_first()
         iter_ = self._get_folder_iter(folder_title)
         if iter_ is not None:
             self._tree_view.disconnect(self._signal_handles['row-expanded'])
@@ -411,9 +460,7 @@ class ChannelViewer(Gtk.ScrolledWindow):
             self._signal_handles['row-collapsed'] = self._tree_view.connect('row-collapsed', self._on_row_collapsed)
 
     def _get_folder_iter(self, folder_title):
-        for row in self._tree_store:
-            if row[0] == folder_title:
-                return row.iter
+        return self._get_row_iter(self._folder_rows, folder_title)
 
     def _folder_update_unread(self, folder_iter):
         news_count = 0
@@ -427,11 +474,14 @@ class ChannelViewer(Gtk.ScrolledWindow):
                 if iter_ is None:
                     break
 
-        self._tree_store.set_value(folder_iter, 1, news_count)
+        # nie emituj row-changed jeśli nic się nie zmieniło
+        if self._tree_store.get_value(folder_iter, 1) != news_count:
+            self._tree_store.set_value(folder_iter, 1, news_count)
 
     def add_channel(self, channel_title, unread_count, folder_title=None, icon_name='rss'):
         folder_iter = self._get_folder_iter(folder_title)
         channel_iter = self._tree_store.append(folder_iter, (channel_title, unread_count, self.ITEM_TYPE_CHANNEL, resource.icons[icon_name]))
+        self._channel_rows[channel_title] = self._row_reference(channel_iter)
 
         # jeśli kanał dodano do folderu to uaktualnij liczbę nieprzeczytanych w tym folderze
         if folder_iter is not None:
@@ -441,36 +491,24 @@ class ChannelViewer(Gtk.ScrolledWindow):
 
     def get_selected_title(self):
         model, iter_ = self._tree_view.get_selection().get_selected()
-        if iter is None:
+        if iter_ is None:
             return False
 
         return model.get_value(iter_, 0)
 
-    def _find_channel(self, channel_title, iter_):
-        while iter_ is not None:
-            title = self._tree_store.get_value(iter_, 0)
-            type_ = self._tree_store.get_value(iter_, 2)
-            if type_ == self.ITEM_TYPE_CHANNEL and title == channel_title:
-                return iter_
-            if self._tree_store.iter_has_child(iter_):
-                a = self._find_channel(channel_title, self._tree_store.iter_children(iter_))
-                if a is not None:
-                    return a
-            iter_ = self._tree_store.iter_next(iter_)
-        return None
-
     def clear_news_count(self):
         for row in self._tree_store:
             self._tree_store.set_value(row.iter, 1, 0)
 
     def dec_unread_count(self, channel_title):
-        iter_ = self._tree_store.get_iter_first()
-        iter_ = self._find_channel(channel_title, iter_)
-        if iter_ is not None:
-                news_count = self._tree_store.get_value(iter_, 1)
-                if news_count <= 0:
-                    news_count = 1
-                self._tree_store.set_value(iter_, 1, news_count - 1)
+        iter_ = self._get_channel_iter(channel_title)
+        if iter_ is None:
+            return
+
+        news_count = self._tree_store.get_value(iter_, 1)
+        if news_count <= 0:
+            news_count = 1
+        self._tree_store.set_value(iter_, 1, news_count - 1)
 
         # jeśli kanał jest w folderze to odśwież również wartość dla folderu
         folder_iter = self._tree_store.iter_parent(iter_)
@@ -479,8 +517,7 @@ class ChannelViewer(Gtk.ScrolledWindow):
 
     def set_channel_unread(self, channel_title, unread_count):
         # znajdź element w drzewie
-        iter_ = self._tree_store.get_iter_first()
-        iter_ = self._find_channel(channel_title, iter_)
+        iter_ = self._get_channel_iter(channel_title)
         if iter_ is not None:
             # uaktualnij ilość nieprzeczytanych w UI
             self._tree_store.set_value(iter_, 1, unread_count)
@@ -490,26 +527,31 @@ class ChannelViewer(Gtk.ScrolledWindow):
             if folder_iter is not None:
                 self._folder_update_unread(folder_iter)
 
-    def select_channel(self, channel_title):
-        channel = None
+    def set_channels_unread(self, unread_counts):
+        '''Ustawia ilość nieprzeczytanych dla wielu kanałów naraz ({tytuł kanału: ilość}).
 
-        # wyszukaj wśród kanałów bez folderów
-        for row in self._tree_store:
-            # kanały poza folderami
-            if row[2] == self.ITEM_TYPE_CHANNEL and row[0] == channel_title:
-                channel = row
-                break
+        Zmieniane są tylko wiersze z inną wartością, a suma każdego folderu jest liczona raz.'''
+        folders = {}
+        for channel_title, unread_count in unread_counts.items():
+            iter_ = self._get_channel_iter(channel_title)
+            if iter_ is None or self._tree_store.get_value(iter_, 1) == unread_count:
+                continue
 
-            # wyszukaj w kanałach wewnątrz folderów
-            elif row[2] == self.ITEM_TYPE_FOLDER:
-                for i in row.iterchildren():
-                    if i[0] == channel_title:
-                        channel = i
-                        break
+            self._tree_store.set_value(iter_, 1, unread_count)
+
+            folder_iter = self._tree_store.iter_parent(iter_)
+            if folder_iter is not None:
+                folders[self._tree_store.get_value(folder_iter, 0)] = folder_iter
+
+        for folder_iter in folders.values():
+            self._folder_update_unread(folder_iter)
 
-        if channel is None:
+    def select_channel(self, channel_title):
+        iter_ = self._get_channel_iter(channel_title)
+        if iter_ is None:
             return False
 
+        channel = self._tree_store[iter_]
         self._tree_view.get_selection().select_iter(channel.iter)
         self._tree_view.scroll_to_cell(channel.path, None, True, 0.5, 0.5)
         self._selected_channel = channel
@@ -570,8 +612,17 @@ class ChannelViewer(Gtk.ScrolledWindow):
             channel_title = model.get_value(iter_, 0)
             if callable(self._on_delete_channel):
                 if self._on_delete_channel(channel_title):
+                    folder_iter = self._tree_store.iter_parent(iter_)
+                    if model.get_value(iter_, 2) == self.ITEM_TYPE_CHANNEL:
+                        self._channel_rows.pop(channel_title, None)
+                    else:
+                        self._folder_rows.pop(channel_title, None)
                     self._tree_store.remove(iter_)
 
+                    # odśwież ilość nieprzeczytanych w folderze usuniętego kanału
+                    if folder_iter is not None:
+                        self._folder_update_unread(folder_iter)
+
 
     def _on_row_activated(self, tree_view, tree_path, tree_column):
         # ustal tytuł zaznaczonego kanału
@@ -616,6 +667,86 @@ class FolderDialog(Gtk.Dialog):
         self.response(Gtk.ResponseType.OK)
 
 
+class RetentionDialog(Gtk.Dialog):
+    def __init__(self, parent):
+        super().__init__()
+        self.set_modal(True)
+        self.set_title('Retention')
+        self.set_transient_for(parent)
+        self.set_default_response(Gtk.ResponseType.OK)
+        self.set_skip_taskbar_hint(True)
+        self.set_destroy_with_parent(True)
+        self.add_button('Cancel', Gtk.ResponseType.CANCEL)
+        self.add_button('OK', Gtk.ResponseType.OK)
+
+        # form
+        days_label = Gtk.Label('Keep read news for days (0 - forever)')
+        self._days_spin = Gtk.SpinButton.new_with_range(0, 3650, 1)
+        self.vbox.pack_start(days_label, False, False, 0)
+        self.vbox.pack_start(self._days_spin, False, False, 0)
+
+        self.show_all()
+
+    def set_data(self, values):
+        self._days_spin.set_value(values['days'])
+
+    def get_data(self):
+        return {
+            'days': self._days_spin.get_value_as_int()
+        }
+
+
+class UpdateMetricsDialog(Gtk.Dialog):
+    '''Podsumowanie ostatniej aktualizacji i kanały od najwolniejszego (com.bps.news.metrics.get_report).'''
+
+    def __init__(self, parent, report):
+        super().__init__()
+        self.set_size_request(800, 480)
+        self.set_modal(True)
+        self.set_title('Update statistics')
+        self.set_transient_for(parent)
+        self.set_default_response(Gtk.ResponseType.OK)
+        self.set_skip_taskbar_hint(True)
+        self.set_destroy_with_parent(True)
+        self.add_button('OK', Gtk.ResponseType.OK)
+
+        if report is None:
+            self.vbox.pack_start(Gtk.Label('No update statistics yet.'), False, False, 0)
+            self.show_all()
+            return
+
+        # podsumowanie aktualizacji
+        summary = com.bps.news.metrics.format_report(report, slowest=0)
+        summary_label = Gtk.Label('\n'.join(summary))
+        summary_label.set_line_wrap(True)
+        self.vbox.pack_start(summary_label, False, False, 0)
+
+        # kanały, czasy etapów w sekundach
+        columns = ['Channel'] + [phase for column, phase in com.bps.news.metrics.PHASES] + ['KiB', 'New', 'Status']
+        list_store = Gtk.ListStore(*[str] * len(columns))
+        for row in report['channels']:
+            if row['error']:
+                status = row['error']
+            else:
+                status = 'not modified' if row['not_modified'] else ''
+            list_store.append(
+                [row['title'] or '']
+                + ['' if row[column] is None else f'{row[column]:.2f}' for column, phase in com.bps.news.metrics.PHASES]
+                + ['' if row['bytes'] is None else f'{row["bytes"] / 1024:.0f}', str(row['new_items']), status]
+            )
+
+        tree_view = Gtk.TreeView(list_store)
+        for i, title in enumerate(columns):
+            renderer = Gtk.CellRendererText()
+            tree_view.append_column(Gtk.TreeViewColumn(title, renderer, text=i))
+
+        scrollbars = Gtk.ScrolledWindow()
+        scrollbars.add(tree_view)
+        self.vbox.pack_start(scrollbars, True, True, 0)
+
+        self.show_all()
+
+
 class AboutDialog(Gtk.Dialog):
     def __init__(self, parent):
         super().__init__()
@@ -683,10 +814,14 @@ class ProgressDialog(Gtk.Dialog):
         self._progressbar.set_fraction(pos)
 
         if msg:
-            end_iter = self._log_text_buffer.get_end_iter()
-            if end_iter and self.is_visible():
-                self._log_text_buffer.insert(end_iter, f'{msg}\n')
-                self._log_text_view.scroll_to_iter(end_iter, 0.3, False, 0, 0)
+            self.add_log([msg])
+
+    def add_log(self, lines):
+        '''Dopisuje wiele linii do logu jednym wstawieniem i jednym przewinięciem.'''
+        end_iter = self._log_text_buffer.get_end_iter()
+        if lines and end_iter and self.is_visible():
+            self._log_text_buffer.insert(end_iter, ''.join(f'{line}\n' for line in lines))
+            self._log_text_view.scroll_to_iter(end_iter, 0.3, False, 0, 0)
 
     def show(self):
         # reset dialog controls
@@ -1,6 +1,9 @@
+import time
+import queue
 import threading
 import feedparser
-from gi.repository import GObject
+from com.bps.news.fetcher import ThreadFetcher, AsyncFetcher, FetchError
+from com.bps.news.scheduler import Scheduler
 
 
 class ChannelType:
@@ -13,26 +16,92 @@ class Channel:
         ChannelType.REST: 'RestApiChannel'
     }
 
-    def __init__(self, url):
+    def __init__(self, url, etag=None, modified=None):
         self._url = url
         self._channel_type = ChannelType.RSS
 
+        # dane do zapytań warunkowych (If-None-Match / If-Modified-Since)
+        self.etag = etag
+        self.modified = modified
+        self.not_modified = False
+
+        # Content-Type odpowiedzi, kodowanie znaków gdy XML go nie deklaruje
+        self.content_type = None
+
+        # czas pobierania i parsowania w sekundach, ustawiany przez fetcher
+        self.fetch_time = 0.0
+
+        # szczegóły pobierania, None gdy fetcher ich nie mierzy (feedparser pobiera i parsuje naraz)
+        self.connect_time = None
+        self.download_time = None
+        self.parse_time = None
+        self.bytes = None
+
+    def get_url(self):
+        return self._url
+
+    def get_request(self):
+        '''Zwraca adres URL oraz dodatkowe nagłówki HTTP potrzebne do pobrania kanału.'''
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.modified:
+            headers['If-Modified-Since'] = self.modified
+        return self._url, headers
+
+    def set_response(self, status, headers):
+        '''Zapamiętuje dane do zapytań warunkowych z odpowiedzi serwera.'''
+        self.not_modified = status == 304
+        if status == 200:
+            self.etag = headers.get('etag')
+            self.modified = headers.get('last-modified')
+            self.content_type = headers.get('content-type')
+
     def get_news(self):
         raise NotImplementedError()
 
+    def parse(self, data):
+        '''Zamienia pobraną treść kanału na listę wpisów.'''
+        raise NotImplementedError()
+
     @classmethod
-    def create_channel(cls, url, channel_type):
-        return globals()[cls.Map[channel_type]](url)
+    def create_channel(cls, url, channel_type, etag=None, modified=None):
+        return globals()[cls.Map[channel_type]](url, etag, modified)
 
 
 class RssChannel(Channel):
-    def __init__(self, url):
-        super().__init__(url)
+    def __init__(self, url, etag=None, modified=None):
+        super().__init__(url, etag, modified)
         self._channel_type = ChannelType.RSS
 
     def get_news(self):
-        data = feedparser.parse(self._url)
+        data = feedparser.parse(self._url, etag=self.etag, modified=self.modified)
+        status = data.get('status')
+
+        # kanał nie zmienił się od ostatniego pobrania
+        if status == 304:
+            self.not_modified = True
+            return []
+
+        # błąd serwera jak w AsyncFetcher._download, zapamiętane ETag / Last-Modified zostają
+        if status is not None and status >= 400:
+            raise FetchError(f'HTTP {status} {self._url}')
+
+        # feedparser podaje 301/302 gdy treść pobrano po przekierowaniu, bez statusu nie było odpowiedzi HTTP
+        if status is not None:
+            self.etag = data.get('etag')
+            self.modified = data.get('modified')
+        return self._get_items(data)
+
+    def parse(self, data):
+        # content-location pozwala rozwiązać względne linki, a content-type ustalić kodowanie,
+        # tak jak przy pobieraniu przez feedparser
+        response_headers = {'content-location': self._url}
+        if self.content_type:
+            response_headers['content-type'] = self.content_type
+        return self._get_items(feedparser.parse(data, response_headers=response_headers))
 
+    def _get_items(self, data):
         # do not hide exceptions from getting data
         # raising exception ignores invalid rss channels from beeing viewed by user
         # even if this XML is only partially invalid.
@@ -43,53 +112,229 @@ class RssChannel(Channel):
 
 
 class RestApiChannel(Channel):
-    def __init__(self, url):
-        super().__init__(url)
+    def __init__(self, url, etag=None, modified=None):
+        super().__init__(url, etag, modified)
         self._channel_type = ChannelType.REST
 
 
+class ChannelStats:
+    '''Wynik aktualizacji jednego kanału przekazywany do interfejsu i zapisywany w channel_metrics.
+
+    Czasy w sekundach: connect (DNS i połączenie), download, parse, fetch (razem pobieranie i parsowanie),
+    add_news, scoring, commit oraz duration - cały czas kanału.'''
+
+    __slots__ = (
+        'title', 'new_items', 'duration', 'error', 'not_modified', 'channel_id',
+        'connect_time', 'download_time', 'parse_time', 'fetch_time',
+        'add_news_time', 'scoring_time', 'commit_time', 'bytes'
+    )
+
+    def __init__(self, title, new_items=0, duration=0.0, error=None, not_modified=False, channel_id=None):
+        self.title = title
+        self.new_items = new_items
+        self.duration = duration
+        self.error = error
+        self.not_modified = not_modified
+        self.channel_id = channel_id
+        self.connect_time = None
+        self.download_time = None
+        self.parse_time = None
+        self.fetch_time = 0.0
+        self.add_news_time = 0.0
+        self.scoring_time = 0.0
+        self.commit_time = 0.0
+        self.bytes = None
+
+    def set_fetch(self, channel):
+        '''Przepisuje pomiary pobierania zapisane w kanale przez fetcher.'''
+        self.connect_time = channel.connect_time
+        self.download_time = channel.download_time
+        self.parse_time = channel.parse_time
+        self.fetch_time = channel.fetch_time
+        self.bytes = channel.bytes
+
+
+class ProgressReporter:
+    '''Zbiera wyniki kanałów i przekazuje je porcjami, nie częściej niż co interval sekund.
+
+    on_progress(ilość zakończonych kanałów, ilość wszystkich kanałów, [ChannelStats, ...]) jest
+    wywoływane przez dispatch (np. GObject.idle_add), domyślnie bezpośrednio w wątku aktualizacji.'''
+
+    # jak często wątek aktualizacji sprawdza czy nie czekają wyniki do przekazania
+    POLL_INTERVAL = 0.05
+
+    def __init__(self, on_progress, total, interval=0.1, dispatch=None):
+        self._on_progress = on_progress
+        self._total = total
+        self._interval = interval
+        self._dispatch = dispatch or _call
+        self._pending = []
+        self._done = 0
+        self._last_flush = 0.0
+
+    def add(self, stats):
+        self._pending.append(stats)
+        self._done += 1
+        self.poll()
+
+    def poll(self):
+        '''Przekazuje zebrane wyniki jeśli od poprzedniej porcji minęło interval sekund.'''
+        if self._pending and time.monotonic() - self._last_flush >= self._interval:
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            pending, self._pending = self._pending, []
+            self._dispatch(self._on_progress, self._done, self._total, pending)
+        self._last_flush = time.monotonic()
+
+
+def _call(fn, *args):
+    fn(*args)
+
+
 class Updater(threading.Thread):
-    def __init__(self, database, channels, on_channel_end=None, on_update_end=None):
+    ENGINE_THREADS = 'threads'
+    ENGINE_ASYNCIO = 'asyncio'
+
+    def __init__(self, database, channels, on_progress=None, on_update_end=None, jobs=8, per_host=2, engine=ENGINE_THREADS, dispatch=None):
         super().__init__()
         self._db = database
         self._channels = channels
-        self._on_channel_end = on_channel_end
+        self._on_progress = on_progress
         self._on_update_end = on_update_end
+
+        # dispatch(fn, *args) przekazuje wywołania zwrotne do wątku interfejsu (GObject.idle_add),
+        # bez niego są wywoływane w wątku aktualizacji (wiersz poleceń)
+        self._dispatch = dispatch or _call
         self._do_stop = False
+        self.not_modified_count = 0
+
+        # wyniki kanałów w kolejności zakończenia, czas całej aktualizacji i jej id w update_run
+        self.stats = []
+        self.duration = 0.0
+        self.run_id = None
+
+        # zapisuje historię nowych wpisów i wylicza termin następnej aktualizacji kanałów
+        self._scheduler = Scheduler(database)
+
+        # jobs - ilość wątków pobierających (threads) lub jednoczesnych pobierań (asyncio)
+        # per_host - limit jednoczesnych połączeń do jednego hosta
+        self._engine = engine
+        if engine == self.ENGINE_ASYNCIO:
+            self._fetcher = AsyncFetcher(concurrency=jobs, per_host=per_host)
+        else:
+            self._fetcher = ThreadFetcher(jobs=jobs, per_host=per_host)
+
+    def _fetch(self, results):
+        # wykonywane w osobnym wątku - tylko pobieranie, bez dostępu do bazy danych
+        jobs = []
+        for row in self._channels:
+            channel = Channel.create_channel(row['url'], row['channel_type'], row['etag'], row['last_modified'])
+            jobs.append(((row, channel), channel))
+
+        try:
+            self._fetcher.fetch(jobs, lambda key, items, error: results.put((*key, items, error)), lambda: self._do_stop)
+        finally:
+            results.put(None)
 
     def run(self):
-        num_channels = len(self._channels)
-        channel_index = 0.001
+        progress = None
+        if callable(self._on_progress):
+            progress = ProgressReporter(self._on_progress, len(self._channels), dispatch=self._dispatch)
+
+        started_at = time.time()
+        run_start = time.perf_counter()
+
+        results = queue.Queue()
+        fetch_thread = threading.Thread(target=self._fetch, args=(results,))
+        fetch_thread.start()
+
+        # ten wątek jest jedynym który zapisuje do bazy danych
+        while True:
+            try:
+                result = results.get(timeout=ProgressReporter.POLL_INTERVAL)
+            except queue.Empty:
+                # przekaż wyniki czekające na koniec okresu
+                if progress is not None:
+                    progress.poll()
+                continue
+
+            if result is None:
+                break
+            row, channel, items, error = result
 
-        # dla każdego kanału w bazie
-        for id, title, url, channel_type, unread_count, folder_title in self._channels:
             # user requested end of update?
             if self._do_stop:
-                break
+                continue
+
+            title = row['title']
+            start = time.perf_counter()
+            stats = ChannelStats(title, channel_id=row['id'])
+            stats.set_fetch(channel)
+
+            # kanał bez zmian - nie ma czego parsować, dodawać ani oceniać
+            if error is None and channel.not_modified:
+                self.not_modified_count += 1
+                stats.not_modified = True
+                self._scheduler.channel_updated(row['id'], row['update_interval'], 0)
+                commit_start = time.perf_counter()
+                self._db.commit()
+                stats.commit_time = time.perf_counter() - commit_start
+                stats.duration = channel.fetch_time + time.perf_counter() - start
+                self.stats.append(stats)
+                if progress is not None:
+                    progress.add(stats)
+                continue
 
-            # get items from next channel
-            channel = Channel.create_channel(url, channel_type)
             try:
-                items = channel.get_news()
+                if error is not None:
+                    raise error
 
                 # dodaj nowe wpisy do bazy danych,
                 # powtarajace się zostaną zignorowane
-                self._db.add_news(title, items)
+                phase_start = time.perf_counter()
+                news_ids = self._db.add_news(title, items)
+                stats.add_news_time = time.perf_counter() - phase_start
+                self._scheduler.channel_updated(row['id'], row['update_interval'], len(news_ids))
 
-                if callable(self._on_channel_end):
-                    GObject.idle_add(self._on_channel_end, title, channel_index, num_channels, items)
+                # oceń tylko nowo dodane wpisy, wagi słów się nie zmieniły
+                phase_start = time.perf_counter()
+                self._db.recommend_update_quality_ids(news_ids)
+                stats.scoring_time = time.perf_counter() - phase_start
+
+                # zapamiętaj dane do zapytań warunkowych
+                if channel.etag != row['etag'] or channel.modified != row['last_modified']:
+                    self._db.set_channel_cache(row['id'], channel.etag, channel.modified)
+
+                stats.new_items = len(news_ids)
 
             except Exception as e:
-                print(f'Error: Channel name: {title}; exception: {e}')
+                # błąd wypisuje odbiorca on_progress (okno postępu, news --update bez --quiet)
+                self._scheduler.channel_failed(row['id'], row['update_interval'])
+                stats.error = str(e) or e.__class__.__name__
 
             finally:
-                channel_index += 1
-                self._db.recommend_update_quality_all()
+                commit_start = time.perf_counter()
                 self._db.commit()
+                stats.commit_time = time.perf_counter() - commit_start
+                stats.duration = channel.fetch_time + time.perf_counter() - start
+                self.stats.append(stats)
+                if progress is not None:
+                    progress.add(stats)
+
+        fetch_thread.join()
+        self.duration = time.perf_counter() - run_start
+
+        # pomiary kanałów zapisane jednym poleceniem, patrz com.bps.news.metrics
+        if self.stats:
+            self.run_id = self._db.add_update_run(started_at, self.duration, self._engine, self.stats)
+
+        if progress is not None:
+            progress.flush()
+
         if callable(self._on_update_end):
-            GObject.idle_add(self._on_update_end)
+            self._dispatch(self._on_update_end)
 
     def cancel(self):
-        self._db.recommend_update_quality_all()
-        self._db.commit()
         self._do_stop = True
@@ -1,3 +1,6 @@
+-- plik zmniejsza się po usunięciu starych newsów (Database.incremental_vacuum)
+pragma auto_vacuum = incremental;
+
 create table folder(
     id integer primary key autoincrement,
     title varchar(100) not null unique,
@@ -10,6 +13,11 @@ create table channel(
     url varchar(512) not null,
     folder_id integer,
     channel_type integer default 0,
+    etag varchar(255),
+    last_modified varchar(64),
+    update_interval integer,
+    next_update integer not null default 0,
+    unread_count integer not null default 0,
     foreign key (folder_id) references folder(id)
 );
 
@@ -18,12 +26,47 @@ create table news(
     channel_id int not null,
     title varchar(256) not null,
     url varchar(512) not null unique,
+    -- HTML spakowany zlib (Database.add_news), typ kolumny jak w plikach po migracjach
     summary text not null,
     is_read boolean default 0,
     quality int not null default 0,
+    read_at integer,
+    text text not null default '',
+    foreign key (channel_id) references channel(id)
+);
+
+create index channel_title_idx on channel(title);
+
+create table channel_history(
+    id integer primary key autoincrement,
+    channel_id integer not null,
+    updated_at integer not null,
+    new_items integer not null default 0,
     foreign key (channel_id) references channel(id)
 );
 
+create index channel_history_channel_idx on channel_history(channel_id, updated_at);
+
+create index news_unread_quality_idx on news(is_read, quality);
+create index news_channel_unread_idx on news(channel_id, is_read, quality);
+
+create trigger news_unread_insert after insert on news when new.is_read = 0
+begin
+    update channel set unread_count = unread_count + 1 where id = new.channel_id;
+end;
+
+create trigger news_unread_delete after delete on news when old.is_read = 0
+begin
+    update channel set unread_count = unread_count - 1 where id = old.channel_id;
+end;
+
+create trigger news_unread_update after update of is_read, channel_id on news
+when old.is_read is not new.is_read or old.channel_id is not new.channel_id
+begin
+    update channel set unread_count = unread_count - 1 where id = old.channel_id and old.is_read = 0;
+    update channel set unread_count = unread_count + 1 where id = new.channel_id and new.is_read = 0;
+end;
+
 create table words(
     id integer primary key autoincrement,
     word varchar(255) not null unique,
@@ -31,6 +74,102 @@ create table words(
     use boolean default 1
 );
 
+create table news_word(
+    news_id integer not null,
+    word_id integer not null,
+    count integer not null default 1,
+    primary key (news_id, word_id),
+    foreign key (news_id) references news(id),
+    foreign key (word_id) references words(id)
+) without rowid;
+
+create index news_word_word_idx on news_word(word_id, news_id);
+
+create trigger news_word_read after update of is_read on news when new.is_read = 1
+begin
+    delete from news_word where news_id = new.id;
+end;
+
+create trigger news_word_delete after delete on news
+begin
+    delete from news_word where news_id = old.id;
+end;
+
+create virtual table news_fts using fts5(
+    title,
+    text,
+    content='news',
+    content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2',
+    prefix='2 3'
+);
+
+create trigger news_fts_insert after insert on news
+begin
+    insert into news_fts(rowid, title, text) values (new.id, new.title, new.text);
+end;
+
+create trigger news_fts_delete after delete on news
+begin
+    insert into news_fts(news_fts, rowid, title, text) values ('delete', old.id, old.title, old.text);
+end;
+
+create trigger news_fts_update after update of title, text on news
+begin
+    insert into news_fts(news_fts, rowid, title, text) values ('delete', old.id, old.title, old.text);
+    insert into news_fts(rowid, title, text) values (new.id, new.title, new.text);
+end;
+
+create trigger news_read_at after update of is_read on news
+when new.is_read = 1 and old.is_read = 0
+begin
+    update news set read_at = cast(strftime('%s', 'now') as integer) where id = new.id;
+end;
+
+create index news_read_at_idx on news(read_at) where is_read = 1;
+
+create table news_purged(
+    url varchar(512) not null primary key
+) without rowid;
+
+create table settings(
+    key varchar(100) not null primary key,
+    value text
+);
+
+create table update_run(
+    id integer primary key,
+    started_at integer not null,
+    duration real not null,
+    engine varchar(20),
+    channels integer not null default 0,
+    new_items integer not null default 0,
+    not_modified integer not null default 0,
+    errors integer not null default 0,
+    bytes integer
+);
+
+create table channel_metrics(
+    run_id integer not null,
+    channel_id integer not null,
+    connect_time real,
+    download_time real,
+    parse_time real,
+    fetch_time real not null default 0,
+    add_news_time real not null default 0,
+    scoring_time real not null default 0,
+    commit_time real not null default 0,
+    total_time real not null default 0,
+    bytes integer,
+    new_items integer not null default 0,
+    not_modified integer not null default 0,
+    error text,
+    primary key(run_id, channel_id)
+) without rowid;
+
+-- wersja schematu, patrz Database._migrate
+pragma user_version = 6;
+
 -- test data
 insert into channel(title, url) values
     ('Ścigani.pl', 'http://www.scigani.pl/rss/programista/'),
@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 
-import com.bps.news
+import sys
+import com.bps.news.cli
 
 if __name__ == '__main__':
-    app = com.bps.news.App()
-    app.run()
+    sys.exit(com.bps.news.cli.main())